@@ -14,14 +14,21 @@
 # ---------------------------------------------------------------------------
 
 from __future__ import annotations
+from bisect import bisect_left
+from collections import deque
 from dataclasses import dataclass
-from enum import Enum
-from math import sin
+from enum import Enum, IntFlag
+from itertools import repeat
+from operator import attrgetter
+import math
 import time
 import logging
+import numpy as np
 from escape import Ansi
-
-from random import random
+from paeexpr import PaeExpression
+from paegen import PaeRandomSource, node_seed
+from paefilter import PaeP2Quantile, PaeWindowQuantile, PaeWindowExtreme
+from paetimer import PaeTimer, PaeTimerWheel
 
 
 # class PaeFType(Enum):
@@ -76,6 +83,19 @@ class PaeType(Enum):
     Multiply = 12
     Division = 13
     Multiply_Add = 14
+    Expression = 15
+    Constant = 16
+
+    VectorSum = 20
+    VectorMean = 21
+    VectorMax = 22
+    VectorMin = 23
+
+    Quantile = 24
+    WindowQuantile = 25
+    Median = 26
+    WindowMin = 27
+    WindowMax = 28
 
     Absolute = 40
     Above = 41
@@ -91,6 +111,47 @@ class PaeType(Enum):
     Alarm_below = 201
     Alarm_between = 203
 
+    ModbusInput = 300
+    ModbusOutput = 301
+
+
+class PaeEventType(Enum):
+    Rising = 0
+    Falling = 1
+    Trigger = 2
+    Expired = 3
+    AlarmOn = 4
+    AlarmOff = 5
+    Acknowledged = 6
+
+
+class PaeFlag(IntFlag):
+    Disabled = 1
+    SourceDisabled = 2
+    Invalid = 4
+    NoData = 8
+    OutOfRange = 16
+
+
+# Flags that are part of the quality of a value, they are passed on to the
+# nodes computed from it
+QUALITY_FLAGS = int(PaeFlag.Invalid | PaeFlag.NoData | PaeFlag.OutOfRange)
+
+
+def quality_text(flags: int) -> str:
+    # Invalid, No data and out of Range, a column each
+    return "".join(
+        c if flags & f else " "
+        for c, f in (("I", PaeFlag.Invalid), ("N", PaeFlag.NoData), ("R", PaeFlag.OutOfRange))
+    )
+
+
+def flags_text(flags: int) -> str:
+    # Enabled or Disabled, Source Disabled and the quality of get_flags()
+    enabled = "D" if flags & PaeFlag.Disabled else "E"
+    n_src = "SD" if flags & PaeFlag.SourceDisabled else "  "
+    return f"{enabled:1} {n_src:2} {quality_text(flags)}"
+
 
 @dataclass
 class PaeObject:
@@ -133,6 +194,21 @@ class PaeObject:
 
 
 class PaeNode(PaeObject):
+    # Parameters that may refer to another node, given as id until initiate()
+    REFS = (
+        "source",
+        "term",
+        "factor",
+        "divider",
+        "max_limit",
+        "min_limit",
+        "offset",
+        "threshold",
+        "period",
+        "amplitude",
+        "rate",
+    )
+
     def __init__(
         self,
         id: str = "",
@@ -148,36 +224,135 @@ class PaeNode(PaeObject):
         plot: bool = True,
         param: bool = False,
         threshold: float = 0.0,
-        period: float = 1.0,
+        period: float = None,
         amplitude: float = 1.0,
         average: int = 1,
         divider: float = 1.0,
         trigger: bool = False,
+        device: str = "",
+        address: int = 0,
+        output: bool = False,
+        expr: str = "",
+        seed: int = None,
+        channels: int = 0,
+        quantile: float = 0.5,
+        window: int = 100,
+        span: float = 0.0,
+        reload: float = 20.0,
+        value: float = 0.0,
+        hysteresis: float = 0.0,
+        rate: float = 1.0,
     ) -> None:
         super().__init__(name=name)
         self.id = id
-        self.value = 0.0
+        # A node with channels has a numpy vector as value and is updated
+        # element-wise, see update_vector()
+        self.channels = channels
+        self.value = np.full(channels, float(value)) if channels else value
         self.last = 0.0
         self.type = type
         self.source = source
-        self.invalid = False
-        self.no_data = False
-        self.out_of_range = False
+        # Quality, a mask of QUALITY_FLAGS. status is what is set on the node
+        # itself, by its evaluation or by a driver, quality adds that of the
+        # inputs and is what the node reports. inputs are set by initiate().
+        self.status = 0
+        self.inherited = 0
+        self.quality = 0
+        self.inputs = []
         self.max_limit = max_limit
         self.min_limit = min_limit
         self.term = term
         self.offset = offset
         self.factor = factor
         self.threshold = threshold
+        # Seconds. A sine is 4 pi s by default, as sin(tick / 20) was at
+        # 10 ticks per second.
+        if period is None:
+            period = 4 * math.pi if type == PaeType.Sine else 1.0
         self.period = period
+        self.phase = 0.0
         self.amplitude = amplitude
+        # Change per second of RateLimit
+        self.rate = rate
+        # Motor time of the last evaluation, for the types that depend on time
+        self.stamp = None
         self.average = average
         self.divider = divider
+        self.quantile = quantile
+        self.window = window
+        self.span = span
+        self.reload = reload
+        self.hysteresis = hysteresis
+        self.timer = None
+        # Last edge state, None unless someone subscribes to the edges
+        self.high = None
+        self.counting = None
         self._trigger = trigger
+        self.device = device
+        self.address = address
+        self.output = output
+        self.seed = seed
+        self.generator = None
         self.new_value = None
+        self.motor = None
+        self.index = -1
+        self.observers = 0
+        self.subscribers = 0
+        self.refs = 0
+        # Computed once by initiate(optimize=True), not evaluated
+        self.folded = False
+        # The identical node this one mirrors, see PaeMotor.merge()
+        self.alias = None
+        self.group = None
+        self.position = 0
+        self.instance = 0
 
         if self.type == PaeType.Average:
             self.filter = PaeFilter(self.average)
+        elif self.type == PaeType.Quantile:
+            self.filter = PaeP2Quantile(self.quantile)
+        elif self.type == PaeType.WindowQuantile:
+            self.filter = PaeWindowQuantile(self.window, self.quantile)
+        elif self.type == PaeType.Median:
+            self.filter = PaeWindowQuantile(self.window, 0.5)
+        elif self.type in (PaeType.WindowMin, PaeType.WindowMax):
+            # Over the last window samples, or the last span seconds if given
+            self.filter = PaeWindowExtreme(self.window, self.span, self.type == PaeType.WindowMax)
+
+        self.expression = None
+        self.expr_nodes = []
+        if self.type == PaeType.Expression:
+            self.expression = PaeExpression(expr)
+
+    @property
+    def invalid(self) -> bool:
+        return bool(self.quality & PaeFlag.Invalid)
+
+    @invalid.setter
+    def invalid(self, on: bool) -> None:
+        self.set_status(PaeFlag.Invalid, on)
+
+    @property
+    def no_data(self) -> bool:
+        return bool(self.quality & PaeFlag.NoData)
+
+    @no_data.setter
+    def no_data(self, on: bool) -> None:
+        self.set_status(PaeFlag.NoData, on)
+
+    @property
+    def out_of_range(self) -> bool:
+        return bool(self.quality & PaeFlag.OutOfRange)
+
+    @out_of_range.setter
+    def out_of_range(self, on: bool) -> None:
+        self.set_status(PaeFlag.OutOfRange, on)
+
+    def set_status(self, flag: PaeFlag, on: bool) -> None:
+        flag = int(flag)
+        status = self.status | flag if on else self.status & ~flag
+        self.status = status
+        self.quality = status | self.inherited
 
     def get_id(self) -> str:
         return self.id
@@ -186,30 +361,130 @@ class PaeNode(PaeObject):
         return self.value
 
     def set_value(self, value: float) -> None:
+        if self.type == PaeType.Constant:
+            raise ValueError(f"Node {self.id} is a constant")
+        if self.channels:
+            value = np.array(value, dtype=float)
+            if value.shape != (self.channels,):
+                raise ValueError(f"Node {self.id} needs {self.channels} values, got shape {value.shape}")
         self.new_value = value
 
+    def enable(self, en: bool) -> None:
+        super().enable(en)
+        if not en:
+            # The time disabled is not integrated
+            self.stamp = None
+        if self.group is not None:
+            self.group.set_enabled(self, en)
+
     def get(self, d) -> float:
         if type(d) is float:
             return d
 
-        if type(d) is PaeNode:
+        if isinstance(d, PaeNode):
             return d.get_value()
 
+        return d
+
     def set_source(self, source: PaeNode) -> None:
         self.source = source
 
     def get_source(self) -> PaeNode:
         return self.source
 
+    def dependencies(self) -> list:
+        if self.alias is not None:
+            return [self.alias]
+        deps = []
+        for ref in self.REFS:
+            d = getattr(self, ref)
+            if isinstance(d, PaeNode):
+                deps.append(d)
+        return deps + self.expr_nodes
+
+    def is_observable(self) -> bool:
+        return self.output or self.type in OBSERVABLE_TYPES
+
     def source_enabled(self) -> bool:
         if self.get_source() is None:
             return True
 
         return self.get_source().is_enabled()
 
+    def get_flags(self) -> int:
+        flags = self.quality
+        if self.is_enabled() is False:
+            flags |= PaeFlag.Disabled
+        if self.source_enabled() is False:
+            flags |= PaeFlag.SourceDisabled
+        return int(flags)
+
+    def get_generator(self):
+        if self.generator is None:
+            seed = self.seed if self.seed is not None else node_seed(self.id, self.index)
+            self.generator = PaeRandomSource(seed)
+        return self.generator
+
+    def elapsed(self) -> float:
+        # Seconds since the last evaluation of the node, None the first time
+        motor = self.motor
+        if motor is None or motor.now is None:
+            return None
+        last, self.stamp = self.stamp, motor.now
+        return None if last is None else motor.now - last
+
+    def advance(self, dt: float) -> float:
+        # Phase of Sine and Square, in periods
+        period = self.get(self.period)
+        if dt is not None and period > 0:
+            self.phase = (self.phase + dt / period) % 1.0
+        return self.phase
+
     def trigger(self) -> None:
+        # Sends a Trigger event. A CountDownTimer is also (re)started, its
+        # value is 1 until reload seconds have passed. Timers are run by the
+        # timer wheel of the motor and are not evaluated every tick.
+        if not self.enabled:
+            return
+        if self.motor is None:
+            self._trigger = self.type == PaeType.CountDownTimer
+            return
         if self.type == PaeType.CountDownTimer:
-            self._trigger = True
+            timers = self.motor.timers
+            if self.timer is not None:
+                timers.stop(self.timer)
+            self.timer = timers.start(self.motor.ticks(self.reload), self.expire)
+            self.value = 1.0
+            self.motor.check_edge(self)
+        self.motor.emit(self, PaeEventType.Trigger)
+
+    def stop(self) -> None:
+        if self.timer is not None:
+            self.motor.timers.stop(self.timer)
+            self.timer = None
+        self.value = 0.0
+        if self.motor is not None:
+            self.motor.check_edge(self)
+
+    def expire(self, timer: PaeTimer) -> None:
+        self.timer = None
+        self.value = 0.0
+        self.motor.check_edge(self)
+        self.motor.emit(self, PaeEventType.Expired)
+
+    def count_edge(self, event: PaeEvent) -> None:
+        # Counter, subscribed to the rising edges of its source
+        if self.enabled:
+            self.value += 1
+
+    def remaining(self) -> float:
+        if self.timer is None:
+            return 0.0
+        return self.motor.timers.remaining(self.timer) * self.motor.dt
+
+    def count(self, evaluations: dict) -> None:
+        if self.enabled:
+            evaluations[self.type] = evaluations.get(self.type, 0) + 1
 
     def update(self) -> None:
         super().update()
@@ -217,6 +492,17 @@ class PaeNode(PaeObject):
         if self.is_enabled() is False:
             return
 
+        # A value is as good as the worst of its inputs
+        inherited = 0
+        for d in self.inputs:
+            inherited |= d.quality
+        self.inherited = inherited
+        self.quality = self.status | inherited
+
+        if self.alias is not None:
+            self.value = self.alias.value
+            return
+
         if self.new_value is not None:
             self.value = self.new_value
             logging.debug(f"New value set: {self.new_value} ")
@@ -227,9 +513,20 @@ class PaeNode(PaeObject):
         if self.source is not None:
             sv = self.source.get_value()
 
+        if self.channels:
+            self.update_vector(sv)
+            return
+
         if self.type == PaeType.Normal:
             self.value = sv
             logging.debug(f"Normal value set: {self.value} ")
+
+        elif self.type == PaeType.ModbusInput:
+            pass
+
+        elif self.type == PaeType.ModbusOutput:
+            self.value = sv
+
         elif self.type == PaeType.Min:
             if sv < self.value:
                 self.value = sv
@@ -239,54 +536,94 @@ class PaeNode(PaeObject):
                 self.value = sv
 
         elif self.type == PaeType.Counter:
-            if self.source.value > 0.5 and self.last < 0.5:
-                self.value += 1
-
-            self.last = self.source.value
+            # Counted by count_edge()
+            pass
 
         elif self.type == PaeType.Average:
             self.value = self.filter.update(sv)
 
+        elif self.type in (
+            PaeType.Quantile,
+            PaeType.WindowQuantile,
+            PaeType.Median,
+        ):
+            self.value = self.filter.update(sv)
+
+        elif self.type in (PaeType.WindowMin, PaeType.WindowMax):
+            # Without a motor the filter keeps its own clock
+            self.value = self.filter.update(sv, None if self.motor is None else self.motor.now)
+
         elif self.type == PaeType.Sine:
-            sv = self.get(self.amplitude) * sin(self.tick / 20) + self.get(self.offset)
-            self.value = sv
-            self.tick += 1
+            phase = self.advance(self.elapsed())
+            self.value = self.get(self.amplitude) * math.sin(2 * math.pi * phase) + self.get(self.offset)
 
         elif self.type == PaeType.Square:
-            if self.tick > 0:
+            # Low the first half of the period
+            if self.advance(self.elapsed()) >= 0.5:
                 self.value = 1
             else:
                 self.value = 0
-            self.tick += 1
-            if self.tick > self.get(self.period):
-                self.tick = -self.get(self.period)
-            # if self.tick > 5:
-            #     self.tick = -5
+
+        elif self.type == PaeType.Integrate:
+            dt = self.elapsed()
+            if dt is not None:
+                self.value += sv * dt
+
+        elif self.type == PaeType.Derivate:
+            dt = self.elapsed()
+            if dt:
+                self.value = (sv - self.last) / dt
+            self.last = sv
 
         elif self.type == PaeType.Random:
-            self.value = self.offset + (self.factor * random())
+            self.value = self.offset + (self.factor * self.get_generator().next())
 
         elif self.type == PaeType.Limit:
             if sv > self.max_limit:
                 self.value = self.max_limit
+                self.out_of_range = True
                 return
             if sv < self.min_limit:
                 self.value = self.min_limit
+                self.out_of_range = True
                 return
             self.value = sv
+            if self.status & PaeFlag.OutOfRange:
+                self.out_of_range = False
 
         elif self.type == PaeType.RateLimit:
-            self.last = self.source.value
+            # Follows the source at most rate per second, from where the
+            # source is at the first evaluation
+            dt = self.elapsed()
+            if dt is None:
+                self.value = sv
+            else:
+                step = self.get(self.rate) * dt
+                self.value = min(max(sv, self.value - step), self.value + step)
 
         elif self.type == PaeType.Multiply:
             self.value = sv * self.get(self.factor)
 
         elif self.type == PaeType.Division:
-            self.value = sv / self.get(self.divider)
+            divider = self.get(self.divider)
+            if divider == 0:
+                # The last value is kept
+                self.invalid = True
+                return
+            self.value = sv / divider
+            if self.status & PaeFlag.Invalid:
+                self.invalid = False
 
         elif self.type == PaeType.Multiply_Add:
             self.value = sv * self.get(self.factor) + self.get(self.term)
 
+        elif self.type == PaeType.Expression:
+            try:
+                self.value = float(self.expression.evaluate([n.value for n in self.expr_nodes]))
+                self.invalid = False
+            except (ArithmeticError, ValueError, TypeError):
+                self.invalid = True
+
         elif self.type == PaeType.Subtract:
             self.value = sv - self.get(self.term)
 
@@ -296,6 +633,18 @@ class PaeNode(PaeObject):
         elif self.type == PaeType.Absolute:
             self.value = abs(sv)
 
+        elif self.type == PaeType.VectorSum:
+            self.value = float(np.sum(sv))
+
+        elif self.type == PaeType.VectorMean:
+            self.value = float(np.mean(sv))
+
+        elif self.type == PaeType.VectorMax:
+            self.value = float(np.max(sv))
+
+        elif self.type == PaeType.VectorMin:
+            self.value = float(np.min(sv))
+
         elif self.type == PaeType.Above:
             if sv > self.threshold:
                 self.value = 1
@@ -308,103 +657,856 @@ class PaeNode(PaeObject):
             else:
                 self.value = 0
 
-        elif self.type == PaeType.CountDownTimer:
+    def update_vector(self, sv) -> None:
+        # The same types as update(), applied to every channel. Parameters may
+        # be numbers or nodes, scalar or with the same number of channels.
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if self.type in (PaeType.Normal, PaeType.ModbusOutput):
+                self.value = sv
 
-            if self.value > 0:
-                self.value -= 1
+            elif self.type == PaeType.Min:
+                self.value = np.minimum(self.value, sv)
 
-            if self._trigger is True:
-                self.value = 200
-                self._trigger = False
+            elif self.type == PaeType.Max:
+                self.value = np.maximum(self.value, sv)
 
-            self.last = sv
+            elif self.type == PaeType.Counter:
+                src = self.source.value
+                self.value = self.value + ((src > 0.5) & (self.last < 0.5))
+                self.last = src
+
+            elif self.type == PaeType.Average:
+                self.value = self.filter.update(sv)
+
+            elif self.type == PaeType.Random:
+                self.value = self.offset + self.factor * self.get_generator().take(self.channels)
+
+            elif self.type == PaeType.Integrate:
+                dt = self.elapsed()
+                if dt is not None:
+                    self.value = self.value + sv * dt
+
+            elif self.type == PaeType.Derivate:
+                dt = self.elapsed()
+                if dt:
+                    self.value = (sv - self.last) / dt
+                self.last = np.array(sv, dtype=float)
+
+            elif self.type == PaeType.RateLimit:
+                dt = self.elapsed()
+                if dt is None:
+                    self.value = np.array(sv, dtype=float)
+                else:
+                    step = self.get(self.rate) * dt
+                    self.value = np.clip(sv, self.value - step, self.value + step)
+
+            elif self.type == PaeType.Limit:
+                hi = self.get(self.max_limit)
+                lo = self.get(self.min_limit)
+                self.value = np.where(sv > hi, hi, np.where(sv < lo, lo, sv))
+                self.out_of_range = bool(np.any((sv > hi) | (sv < lo)))
+
+            elif self.type == PaeType.Multiply:
+                self.value = sv * self.get(self.factor)
+
+            elif self.type == PaeType.Division:
+                self.value = sv / self.get(self.divider)
+                self.invalid = not np.all(np.isfinite(self.value))
+
+            elif self.type == PaeType.Multiply_Add:
+                self.value = sv * self.get(self.factor) + self.get(self.term)
+
+            elif self.type == PaeType.Subtract:
+                self.value = sv - self.get(self.term)
+
+            elif self.type == PaeType.Addition:
+                self.value = sv + self.get(self.term)
+
+            elif self.type == PaeType.Absolute:
+                self.value = np.abs(sv)
+
+            elif self.type == PaeType.Above:
+                self.value = (sv > self.get(self.threshold)).astype(float)
+
+            elif self.type == PaeType.Below:
+                self.value = (sv < self.get(self.threshold)).astype(float)
+
+            elif self.type == PaeType.Expression:
+                try:
+                    value = self.expression.evaluate_batch([n.value for n in self.expr_nodes])
+                    self.value = np.broadcast_to(value, (self.channels,)).astype(float)
+                    self.invalid = not np.all(np.isfinite(self.value))
+                except (ArithmeticError, ValueError, TypeError):
+                    self.invalid = True
+
+            else:
+                self.invalid = True
 
     def __str__(self) -> str:
+        return self.text(self.value, self.get_flags())
 
-        if self.is_enabled() is True:
-            enabled = "E"
+    def text(self, value, flags: int) -> str:
+        # value and flags from the node or from a snapshot of it
+        if self.channels:
+            type = f"{self.type.name}[{self.channels}]"
+            value = float(np.mean(value))
         else:
-            enabled = "D"
+            type = self.type.name
+
+        return f"{self.get_name():24} {self.id:10} {type:16} {value:10.3f}  {flags_text(flags)}"
+
+
+class PaeHistogram:
+    def __init__(self, buckets: tuple) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+@dataclass
+class PaeEvent:
+    type: PaeEventType
+    node: PaeNode
+    tick: int
 
-        if self.source_enabled() is False:
-            n_src = "SD"
-        else:
-            n_src = "  "
 
+@dataclass
+class PaeOptimization:
+    # What initiate(optimize=True) did, by node id. merged maps the id of
+    # every merged node to the id of the node it mirrors.
+    folded: list
+    merged: dict
+    removed: list
+
+    def __str__(self) -> str:
         return (
-            f"{self.get_name():24} {self.id:10} {self.type.name:16} {self.value:10.3f}  {enabled:1} {n_src:2}"
+            f"{len(self.folded)} nodes folded {self.folded}, "
+            f"{len(self.merged)} merged {self.merged}, "
+            f"{len(self.removed)} removed {self.removed}"
         )
 
 
-class PaeMotor(PaeObject):
+@dataclass
+class PaeSnapshot:
+    # Values and flags of all nodes of a motor, in node order. Vector nodes
+    # are NaN in values, their values are in vectors by node index. time is
+    # the wall clock, now and delta the motor time the nodes computed from.
+    tick: int
+    time: float
+    now: float
+    delta: float
+    ids: list
+    values: np.ndarray
+    flags: np.ndarray
+    vectors: dict
+
+    def as_dict(self) -> dict:
+        out = dict(zip(self.ids, self.values.tolist()))
+        for i, value in self.vectors.items():
+            out[self.ids[i]] = value
+        out.pop("", None)
+        return out
+
+    def get(self, node: PaeNode) -> tuple:
+        # (value, flags) of a node of the motor
+        i = node.index
+        vector = self.vectors.get(i)
+        return (self.values.item(i) if vector is None else vector), int(self.flags[i])
+
+
+class PaeWatch:
+    # Schedule step that checks the edges of the watched nodes right after
+    # they are evaluated, so subscribers see them in the same tick
+
+    def __init__(self, motor: PaeMotor, step, nodes: list) -> None:
+        self.motor = motor
+        self.step = step
+        self.nodes = nodes
+
+    def update(self) -> None:
+        self.step.update()
+        for node in self.nodes:
+            self.motor.check_edge(node)
+
+    def count(self, evaluations: dict) -> None:
+        self.step.count(evaluations)
+
+
+class PaeStats:
+    # Engine performance counters, only collected when enabled on the motor
+
+    DURATION_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+    def __init__(self, period: float = 0.1) -> None:
+        self.period = period
+        self.tick_duration = PaeHistogram(self.DURATION_BUCKETS)
+        self.overruns = 0
+        self.evaluations = {}
+        self.input_duration = {}
+
+    def observe_input(self, driver: PaeDriver, duration: float) -> None:
+        name = type(driver).__name__
+        histogram = self.input_duration.get(name)
+        if histogram is None:
+            histogram = PaeHistogram(self.DURATION_BUCKETS)
+            self.input_duration[name] = histogram
+        histogram.observe(duration)
+
+    def observe_tick(self, duration: float) -> None:
+        self.tick_duration.observe(duration)
+        if duration > self.period:
+            self.overruns += 1
+
+
+# Types evaluated by the alarm engine of the motor, see paealarm.py
+ALARM_TYPES = (
+    PaeType.Alarm_above,
+    PaeType.Alarm_below,
+    PaeType.Alarm_between,
+)
+
+# Types that are always evaluated in lazy mode, their effect is visible
+# outside of the motor
+OBSERVABLE_TYPES = ALARM_TYPES + (PaeType.ModbusOutput,)
+
+# Types that are not evaluated every tick
+UNSCHEDULED_TYPES = (PaeType.CountDownTimer, PaeType.Constant)
+
+# Types whose value only depends on their inputs. With optimize they are
+# computed once in initiate() when all inputs are constants.
+FOLDABLE_TYPES = (
+    PaeType.Normal,
+    PaeType.Limit,
+    PaeType.Addition,
+    PaeType.Subtract,
+    PaeType.Multiply,
+    PaeType.Division,
+    PaeType.Multiply_Add,
+    PaeType.Expression,
+    PaeType.VectorSum,
+    PaeType.VectorMean,
+    PaeType.VectorMax,
+    PaeType.VectorMin,
+    PaeType.Absolute,
+    PaeType.Above,
+    PaeType.Below,
+)
+
+
+def resolve(node: PaeNode) -> PaeNode:
+    # The node that computes the value of node, see PaeMotor.merge()
+    return node if node.alias is None else node.alias
+
+
+def same_callback(a, b) -> bool:
+    # Bound methods are created on every access and nodes compare by value,
+    # so compare the parts by identity
+    if getattr(a, "__self__", None) is not getattr(b, "__self__", None):
+        return False
+    return getattr(a, "__func__", a) is getattr(b, "__func__", b)
+
+
+class PaeDriver:
+    # Base for everything that exchanges data with a motor. input() is called
+    # before the nodes are updated and output() after, once every tick.
+
     def __init__(self) -> None:
+        self.motor = None
+        self.nodes = []
+
+    def attach(self, motor: PaeMotor) -> None:
+        self.motor = motor
+
+    def select_nodes(self, ids: list = None, vectors: bool = True) -> list:
+        # The nodes in ids, or all nodes with an id, observed until
+        # release_nodes() so that they are evaluated in lazy mode
+        self.release_nodes()
+        if ids is None:
+            nodes = [node for node in self.motor.nodes if node.id != "" and (vectors or not node.channels)]
+        else:
+            nodes = [self.motor.find_node(id) for id in ids]
+            missing = [id for id, node in zip(ids, nodes) if node is None]
+            if missing:
+                raise ValueError(f"Unknown nodes {missing}")
+            rejected = [node.id for node in nodes if node.channels and not vectors]
+            if rejected:
+                raise ValueError(f"Vector nodes {rejected} not supported by {type(self).__name__}")
+        for node in nodes:
+            self.motor.observe(node)
+        self.nodes = nodes
+        return nodes
+
+    def release_nodes(self) -> None:
+        for node in self.nodes:
+            self.motor.unobserve(node)
+        self.nodes = []
+
+    def input(self) -> None:
+        pass
+
+    def output(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class PaeMotor(PaeObject):
+    def __init__(self, lazy: bool = False, dt: float = 0.1) -> None:
         super().__init__()
+        # Nominal seconds per tick, and the resolution of the timers. Nodes
+        # compute from the time of the tick, so update() may be called at
+        # any rate.
+        self.dt = dt
+        # Monotonic time of the current tick and seconds since the last one
+        self.now = None
+        self.delta = 0.0
+        self.start = None
+        self.timers = PaeTimerWheel()
         self.nodes = []
+        self.ids = {}
+        self.groups = []
+        self.alarms = None
+        self.schedule = []
+        self.schedule_lazy = lazy
+        self.dirty = True
+        self.lazy = lazy
+        self.events = deque()
+        self.handlers = {}
+        self.dispatching = False
+        self.layout = None
+        self.snap = None
+        self.caching = False
+        # Commands from other threads, deque append and popleft are atomic
+        self.commands = deque()
+        self.active = []
+        self.active_index = []
+        self.optimized = False
+        self.initiated = False
+        self.drivers = []
+        self.stats = None
         self.first_run = False
         self.plots = []
 
     def add_node(self, node: PaeNode) -> PaeNode:
+        node.motor = self
+        node.index = len(self.nodes)
         self.nodes.append(node)
+        self.ids.setdefault(node.id, node)
+        self.dirty = True
         return node
 
+    def add_group(self, group) -> None:
+        # Groups evaluate several nodes at once, see paetemplate.py
+        self.groups.append(group)
+
+    def add_driver(self, driver: PaeDriver) -> PaeDriver:
+        driver.attach(self)
+        self.drivers.append(driver)
+        return driver
+
+    def enable_stats(self, period: float = 0.1) -> PaeStats:
+        if self.stats is None:
+            self.stats = PaeStats(period)
+        return self.stats
+
+    def close(self) -> None:
+        for driver in self.drivers:
+            driver.close()
+
+    def ticks(self, seconds: float) -> int:
+        # Timer wheel slots, dt each
+        return max(1, round(seconds / self.dt))
+
+    def clock(self, now: float) -> None:
+        # Sets the time of the tick and runs the timers that are due
+        if now is None:
+            now = time.monotonic()
+        if self.now is None:
+            self.start = now
+            self.delta = 0.0
+        else:
+            self.delta = now - self.now
+        self.now = now
+        self.timers.advance_to(round((now - self.start) / self.dt))
+
+    def call_later(self, seconds: float, callback) -> PaeTimer:
+        # callback(timer) is called at the start of the tick seconds from now
+        return self.timers.start(self.ticks(seconds), callback)
+
     def find_node(self, id: str) -> PaeNode:
+        node = self.ids.get(id)
+        if node is not None and node.id == id:
+            return node
         for node in self.nodes:
             if node.id == id:
                 return node
         return None
 
-    def initiate(self):
+    def initiate(self, optimize: bool = False, keep: list = ()) -> PaeOptimization:
+        # With optimize, identical stateless nodes are evaluated once, nodes
+        # with only constant inputs are computed here once, and only nodes
+        # that are observable, observed, subscribed to or in keep, and what
+        # they depend on, are evaluated. Nodes observed later are evaluated
+        # from then on. keep takes nodes or ids.
         for node in self.nodes:
-            if type(node.source) is str:
-                node.source = self.find_node(node.source)
-
-            if type(node.term) is str:
-                node.term = self.find_node(node.term)
-
-            if type(node.factor) is str:
-                node.factor = self.find_node(node.factor)
+            for ref in PaeNode.REFS:
+                if type(getattr(node, ref)) is str:
+                    setattr(node, ref, self.find_node(getattr(node, ref)))
+
+            if node.expression is not None:
+                node.expr_nodes = [self.find_node(name) for name in node.expression.names]
+                missing = [n for n, d in zip(node.expression.names, node.expr_nodes) if d is None]
+                if missing:
+                    raise ValueError(f"Expression of node {node.id} refers to unknown nodes {missing}")
+
+        if self.alarms is None and any(node.type in ALARM_TYPES for node in self.nodes):
+            # Imported here, paealarm builds on this module
+            from paealarm import PaeAlarms
+
+            self.alarms = PaeAlarms(self)
+            self.add_group(self.alarms)
+
+        for group in self.groups:
+            group.prepare()
+
+        kept = set()
+        for k in keep:
+            node = k if isinstance(k, PaeNode) else self.find_node(k)
+            if node is None:
+                raise ValueError(f"Unknown node {k}")
+            kept.add(id(node))
+
+        self.optimized = optimize
+        for node in self.nodes:
+            node.folded = False
+            node.alias = None
+        merged = self.merge(kept) if optimize else {}
+        for node in self.nodes:
+            node.inputs = node.dependencies()
+        folded = self.fold(kept) if optimize else []
+        self.layout = None
 
-            if type(node.divider) is str:
-                node.divider = self.find_node(node.divider)
+        self.count_edges()
 
-            if type(node.max_limit) is str:
-                node.max_limit = self.find_node(node.max_limit)
+        for node in self.nodes:
+            if node.type == PaeType.CountDownTimer and node._trigger:
+                node._trigger = False
+                node.trigger()
 
-            if type(node.min_limit) is str:
-                node.min_limit = self.find_node(node.min_limit)
+        # Rebuild the active set now that all references are resolved
+        self.active = []
+        self.active_index = []
+        for node in self.nodes:
+            node.refs = 0
+        for node in self.nodes:
+            if node.observers > 0 or node.is_observable():
+                self.reference(node, 1)
+            if node.subscribers > 0:
+                self.reference(node, 1)
+            if id(node) in kept or node.alias is not None:
+                # Aliases only copy a value, they are always kept up to date
+                # for displays and exporters
+                self.reference(node, 1)
+        self.initiated = True
+        self.dirty = True
+
+        if not optimize:
+            return None
+        removed = [
+            node.id
+            for node in self.nodes
+            if node.refs == 0 and not node.folded and node.type not in UNSCHEDULED_TYPES
+        ]
+        report = PaeOptimization(folded, merged, removed)
+        logging.info(f"Optimized: {report}")
+        return report
+
+    def merge(self, kept: set) -> dict:
+        # Nodes of a stateless type with the same inputs and parameters as an
+        # earlier node become aliases of it, they copy its value instead of
+        # computing it. Inputs are compared by the node they resolve to, so
+        # nodes using identical inputs are found identical in turn. The
+        # references of the nodes are left as they are.
+        first = {}
+        merged = {}
+        for node in self.nodes:
+            if node.type not in FOLDABLE_TYPES or id(node) in kept:
+                continue
+            if not node.enabled or node.group is not None:
+                continue
+            if node.source is None and node.type != PaeType.Expression:
+                continue
+            key = self.structure(node)
+            canonical = first.setdefault(key, node)
+            if canonical is not node:
+                node.alias = canonical
+                merged[node.id] = canonical.id
+        return merged
+
+    def structure(self, node: PaeNode) -> tuple:
+        # What the value of a stateless node is computed from
+        refs = tuple(
+            ("node", id(resolve(d))) if isinstance(d, PaeNode) else d
+            for d in map(node.__getattribute__, PaeNode.REFS)
+        )
+        expr = None
+        if node.expression is not None:
+            code = node.expression.code
+            expr = (code.co_code, code.co_consts, code.co_names, tuple(id(resolve(d)) for d in node.expr_nodes))
+        return (node.type, node.channels, refs, expr)
+
+    def fold(self, kept: set) -> list:
+        # Nodes are folded in node order, a node is folded when all its
+        # inputs are constants or nodes folded before it
+        folded = []
+        for node in self.nodes:
+            if node.type not in FOLDABLE_TYPES or id(node) in kept:
+                continue
+            if not node.enabled or node.group is not None:
+                continue
+            if node.source is None and node.type != PaeType.Expression:
+                # An input, set from outside
+                continue
+            if not all(d.type == PaeType.Constant or d.folded for d in node.dependencies()):
+                continue
+            try:
+                node.update()
+            except (ArithmeticError, ValueError, TypeError):
+                continue
+            if node.invalid:
+                continue
+            node.folded = True
+            folded.append(node.id)
+        return folded
+
+    def closure(self, node: PaeNode) -> list:
+        # The node and everything it depends on, directly or indirectly
+        seen = {id(node)}
+        stack = [node]
+        result = []
+        while stack:
+            n = stack.pop()
+            result.append(n)
+            if n.folded:
+                continue
+            for d in n.dependencies():
+                if id(d) not in seen:
+                    seen.add(id(d))
+                    stack.append(d)
+        return result
+
+    def reference(self, node: PaeNode, delta: int) -> None:
+        for n in self.closure(node):
+            n.refs += delta
+            if delta > 0 and n.refs == 1:
+                pos = bisect_left(self.active_index, n.index)
+                self.active_index.insert(pos, n.index)
+                self.active.insert(pos, n)
+                self.dirty = True
+            elif delta < 0 and n.refs == 0:
+                pos = bisect_left(self.active_index, n.index)
+                del self.active_index[pos]
+                del self.active[pos]
+                self.dirty = True
+
+    def count_edges(self) -> None:
+        # Counters count the rising edges of their source, subscribed here
+        # for sources that are nodes. Groups count their own, vectors have
+        # no edges and are counted in update_vector().
+        for node in self.nodes:
+            if node.type == PaeType.Counter:
+                source = node.source
+                if node.group is not None or not isinstance(source, PaeNode) or node.channels or source.channels:
+                    source = None
+                if node.counting is not source:
+                    if node.counting is not None:
+                        self.unsubscribe(node.counting, PaeEventType.Rising, node.count_edge)
+                    if source is not None:
+                        self.subscribe(source, PaeEventType.Rising, node.count_edge)
+                    node.counting = source
+
+    def build_schedule(self) -> None:
+        # What update() evaluates, in order: the nodes, with the members of a
+        # group replaced by the group at the position of its last member.
+        # Steps with nodes whose edges are subscribed to are wrapped to check
+        # the edges.
+        self.count_edges()
+        nodes = self.active if self.lazy or self.optimized else self.nodes
+        last = {}
+        watched = {}
+        for i, node in enumerate(nodes):
+            step = node if node.group is None else node.group
+            last[id(step)] = i
+            if node.high is not None:
+                watched.setdefault(id(step), []).append(node)
+
+        self.schedule = []
+        for i, node in enumerate(nodes):
+            if node.type in UNSCHEDULED_TYPES or node.folded:
+                continue
+            step = node if node.group is None else node.group
+            if last[id(step)] != i:
+                continue
+            if id(step) in watched:
+                step = PaeWatch(self, step, watched[id(step)])
+            self.schedule.append(step)
+        self.schedule_lazy = self.lazy
+        self.dirty = False
+
+    def observe(self, node: PaeNode) -> None:
+        # Mark a node as observed (plotted, exported, ...). In lazy mode only
+        # observed nodes and their dependencies are evaluated.
+        node.observers += 1
+        if node.observers == 1 and self.initiated and not node.is_observable():
+            self.reference(node, 1)
+
+    def unobserve(self, node: PaeNode) -> None:
+        if node.observers == 0:
+            return
+        node.observers -= 1
+        if node.observers == 0 and self.initiated and not node.is_observable():
+            self.reference(node, -1)
+
+    def subscribe(self, node: PaeNode, type: PaeEventType, callback) -> None:
+        # callback(event) is called for every event of type from node
+        if type in (PaeEventType.Rising, PaeEventType.Falling):
+            if node.channels:
+                raise ValueError(f"Node {node.id} is a vector, it has no edges")
+            if node.high is None:
+                node.high = node.value > 0.5
+                self.dirty = True
+        self.handlers.setdefault((id(node), type), []).append(callback)
+        # Sources of events are evaluated in lazy mode too
+        node.subscribers += 1
+        if node.subscribers == 1 and self.initiated:
+            self.reference(node, 1)
+
+    def unsubscribe(self, node: PaeNode, type: PaeEventType, callback) -> None:
+        key = (id(node), type)
+        old = self.handlers.get(key, [])
+        handlers = [h for h in old if not same_callback(h, callback)]
+        if handlers:
+            self.handlers[key] = handlers
+        else:
+            self.handlers.pop(key, None)
+
+        if len(old) > len(handlers):
+            node.subscribers -= len(old) - len(handlers)
+            if node.subscribers == 0 and self.initiated:
+                self.reference(node, -1)
+
+        edges = ((id(node), PaeEventType.Rising), (id(node), PaeEventType.Falling))
+        if node.high is not None and not any(key in self.handlers for key in edges):
+            node.high = None
+            self.dirty = True
+
+    def emit(self, node: PaeNode, type: PaeEventType) -> None:
+        # Events nobody subscribes to are dropped here. The others are
+        # dispatched in order, events sent by handlers after the current one.
+        if (id(node), type) not in self.handlers:
+            return
+        self.events.append(PaeEvent(type, node, self.tick))
+        if self.dispatching:
+            return
+        self.dispatching = True
+        try:
+            while self.events:
+                event = self.events.popleft()
+                for callback in self.handlers.get((id(event.node), event.type), ()):
+                    callback(event)
+        finally:
+            self.dispatching = False
+
+    def check_edge(self, node: PaeNode) -> None:
+        if node.high is None:
+            return
+        high = node.value > 0.5
+        if high != node.high:
+            node.high = high
+            self.emit(node, PaeEventType.Rising if high else PaeEventType.Falling)
+
+    def set_values(self, values, ids: list = None) -> None:
+        # A whole frame of inputs at once: a dict of id to value, or a sequence
+        # or numpy array in the order of ids, or of all nodes. Like set_value()
+        # the values are applied when the nodes are updated.
+        if isinstance(values, dict):
+            ids = values.keys()
+            values = values.values()
+        if ids is None:
+            nodes = self.nodes
+        else:
+            try:
+                nodes = list(map(self.ids.__getitem__, ids))
+            except KeyError as e:
+                raise ValueError(f"Unknown node {e}") from None
+        if isinstance(values, np.ndarray):
+            values = values.tolist()
+        if len(values) != len(nodes):
+            raise ValueError(f"{len(values)} values for {len(nodes)} nodes")
+        constants = [i for i, node in enumerate(nodes) if node.type == PaeType.Constant]
+        if constants and ids is not None:
+            # Checked before any value is set, like in set_value()
+            raise ValueError(f"Nodes {[nodes[i].id for i in constants]} are constants")
+        if constants:
+            # A frame of all nodes, the slots of constants are skipped
+            skip = set(constants)
+            nodes = [node for i, node in enumerate(nodes) if i not in skip]
+            values = [value for i, value in enumerate(values) if i not in skip]
+
+        if any(map(attrgetter("channels"), nodes)):
+            deque(map(PaeNode.set_value, nodes, values), maxlen=0)
+        else:
+            deque(map(setattr, nodes, repeat("new_value"), values), maxlen=0)
+
+    def snapshot(self) -> PaeSnapshot:
+        # Drivers share one snapshot per tick, see output()
+        if self.snap is not None:
+            return self.snap
+
+        n = len(self.nodes)
+        if self.layout is None or self.layout[0] != n:
+            ids = [node.id for node in self.nodes]
+            scalars = [node for node in self.nodes if not node.channels]
+            vectors = [(i, node) for i, node in enumerate(self.nodes) if node.channels]
+            index = np.array([node.index for node in scalars], dtype=np.intp) if vectors else None
+            sources = np.array(
+                [node.source.index if isinstance(node.source, PaeNode) else -1 for node in self.nodes],
+                dtype=np.intp,
+            )
+            self.layout = (n, ids, scalars, index, vectors, sources)
+        _, ids, scalars, index, vectors, sources = self.layout
+
+        if index is None:
+            values = np.fromiter(map(attrgetter("value"), scalars), float, n)
+        else:
+            values = np.full(n, np.nan)
+            values[index] = np.fromiter(map(attrgetter("value"), scalars), float, len(scalars))
+        # get_flags() for all nodes, the quality is already a mask
+        flags = np.fromiter(map(attrgetter("quality"), self.nodes), np.uint16, n)
+        disabled = ~np.fromiter(map(attrgetter("enabled"), self.nodes), bool, n)
+        flags[disabled] |= int(PaeFlag.Disabled)
+        flags[(sources >= 0) & disabled[sources]] |= int(PaeFlag.SourceDisabled)
+        snap = PaeSnapshot(
+            self.tick,
+            time.time(),
+            self.now,
+            self.delta,
+            ids,
+            values,
+            flags,
+            {i: node.value.copy() for i, node in vectors},
+        )
+        if self.caching:
+            self.snap = snap
+        return snap
+
+    def post(self, function, *args) -> None:
+        # Calls function(*args) on the motor thread at the start of the next
+        # tick. Safe from any thread.
+        self.commands.append((function, args))
+
+    def post_set_value(self, node: PaeNode, value: float) -> None:
+        self.commands.append((node.set_value, (value,)))
+
+    def post_set_values(self, values, ids: list = None) -> None:
+        self.commands.append((self.set_values, (values, ids)))
+
+    def post_trigger(self, node: PaeNode) -> None:
+        self.commands.append((node.trigger, ()))
+
+    def post_enable(self, node: PaeNode, en: bool) -> None:
+        self.commands.append((node.enable, (en,)))
+
+    def run_commands(self) -> None:
+        # Only what was posted before the tick started, commands posted
+        # meanwhile wait for the next tick
+        commands = self.commands
+        for _ in range(len(commands)):
+            function, args = commands.popleft()
+            try:
+                function(*args)
+            except Exception as e:
+                logging.warning(f"Command {getattr(function, '__name__', function)} failed: {e}")
+
+    def output(self) -> None:
+        self.caching = True
+        try:
+            for driver in self.drivers:
+                driver.output()
+        finally:
+            self.caching = False
+            self.snap = None
+
+    def update(self, now: float = None) -> None:
+        # now is the time.monotonic() time of the tick, replayed or
+        # simulated runs give their own
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
+
+        if self.commands:
+            self.run_commands()
+
+        for driver in self.drivers:
+            if stats is None:
+                driver.input()
+            else:
+                t = time.perf_counter()
+                driver.input()
+                stats.observe_input(driver, time.perf_counter() - t)
 
-            if type(node.offset) is str:
-                node.offset = self.find_node(node.offset)
+        self.clock(now)
 
-            if type(node.threshold) is str:
-                node.threshold = self.find_node(node.threshold)
+        if self.dirty or self.schedule_lazy != self.lazy:
+            self.build_schedule()
 
-            if type(node.period) is str:
-                node.period = self.find_node(node.period)
+        if stats is None:
+            for node in self.schedule:
+                node.update()
+        else:
+            evaluations = stats.evaluations
+            for node in self.schedule:
+                node.update()
+                node.count(evaluations)
 
-            if type(node.amplitude) is str:
-                node.amplitude = self.find_node(node.amplitude)
+        self.tick += 1
+        self.output()
 
-    def update(self) -> None:
-        for node in self.nodes:
-            node.update()
+        if stats is not None:
+            stats.observe_tick(time.perf_counter() - start)
 
     def printout(self) -> None:
         print(self, end="")
 
     def __str__(self) -> str:
+        return self.text()
+
+    def text(self, snap: PaeSnapshot = None) -> str:
+        # From snap when given, other threads than the motor thread must
+        # not read the nodes while it ticks
+        nodes = self.nodes if snap is None else self.nodes[: len(snap.ids)]
         out = ""
         if self.first_run is not True:
-            for _ in self.nodes:
+            for _ in nodes:
                 out += "\n"
             self.first_run = True
 
         # out += Ansi.HOME
-        for _ in self.nodes:
+        for _ in nodes:
             out += Ansi.RETURN
 
-        for node in self.nodes:
-            out += f"{str(node)}\n"
+        for node in nodes:
+            if snap is None:
+                out += f"{str(node)}\n"
+            else:
+                out += f"{node.text(*snap.get(node))}\n"
         return out
 
 
@@ -414,6 +1516,9 @@ def main() -> None:
     n_min = PaeNode(type=PaeType.Min, source=n_sin)
     n_max = PaeNode(type=PaeType.Max, source=n_sin)
     n_cnt = PaeNode(type=PaeType.Counter, source=n_sqr)
+    # Vector counters count every channel by polling
+    n_vec = PaeNode(type=PaeType.Normal, id="vec", channels=4)
+    n_vcnt = PaeNode(type=PaeType.Counter, source=n_vec, channels=4)
 
     motor = PaeMotor()
 
@@ -422,8 +1527,12 @@ def main() -> None:
     motor.add_node(n_min)
     motor.add_node(n_max)
     motor.add_node(n_cnt)
+    motor.add_node(n_vec)
+    motor.add_node(n_vcnt)
+    motor.initiate()
 
     for i in range(1, 100):
+        motor.post_set_value(n_vec, [i % 2, i % 4 // 2, 0, 1])
         motor.update()
         motor.printout()
         # p = motor.__printout()
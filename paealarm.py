@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+#
+# Alarm engine for Pae
+#
+# File:     paealarm.py
+# Author:   Peter Malmberg  <peter.malmberg@gmail.com>
+# Org:      __ORGANISTATION__
+# Date:     2026-10-19
+# License:  MIT
+# Python:   >= 3.8
+#
+# ----------------------------------------------------------------------------
+#
+# All Alarm_above, Alarm_below and Alarm_between nodes of a motor are
+# evaluated together, as a group created by initiate(). The alarm condition of
+# every node is a band on the value of its source:
+#
+#   Alarm_above    source > threshold
+#   Alarm_below    source < threshold
+#   Alarm_between  min_limit < source < max_limit
+#
+# An active alarm is cleared when the source has left the band by hysteresis.
+# States, acknowledgements and disabled alarms are kept as bit arrays, eight
+# alarms a byte, and all thresholds are compared in one numpy operation.
+#
+# Only alarms that change are touched: their node value is set (1 active,
+# 0 not), AlarmOn or AlarmOff is sent on the event channel of the motor and
+# the events of the tick are handed to the listeners and kept in transitions.
+# An alarm going active is unacknowledged until acknowledge() is called.
+# The quality of an alarm is that of its source, also only set on change.
+#
+
+from __future__ import annotations
+from operator import attrgetter
+import math
+
+import numpy as np
+
+from pae import PaeMotor, PaeNode, PaeType, PaeEvent, PaeEventType
+
+
+class PaeAlarms:
+    def __init__(self, motor: PaeMotor) -> None:
+        self.motor = motor
+        self.nodes = []
+        self.sources = []
+        self.index = {}
+        self.dynamic = []
+        self.on_lo = None
+        self.on_hi = None
+        self.off_lo = None
+        self.off_hi = None
+        self.state = np.zeros(0, dtype=np.uint8)
+        self.acked = np.zeros(0, dtype=np.uint8)
+        self.disabled = np.zeros(0, dtype=np.uint8)
+        self.disabled_count = 0
+        self.quality = np.zeros(0, dtype=np.uint16)
+        self.transitions = []
+        self.listeners = []
+
+    def prepare(self) -> None:
+        # Called by initiate() when all references are resolved. Alarms
+        # already in another group are left to it.
+        self.nodes = [
+            node
+            for node in self.motor.nodes
+            if node.type in (PaeType.Alarm_above, PaeType.Alarm_below, PaeType.Alarm_between)
+            and (node.group is None or node.group is self)
+        ]
+        n = len(self.nodes)
+        for node in self.nodes:
+            if node.source is None:
+                raise ValueError(f"Alarm {node.id} has no source")
+            if node.channels or node.source.channels:
+                raise ValueError(f"Alarm {node.id} on a vector, not supported")
+
+        old = self.index
+        state = self.bits([False] * n)
+        acked = self.bits([True] * n)
+        self.index = {}
+        for i, node in enumerate(self.nodes):
+            node.group = self
+            node.position = i
+            node.instance = 0
+            self.index[id(node)] = i
+            j = old.get(id(node))
+            if j is not None:
+                # Prepared again, keep the state
+                self.put(state, i, self.bit(self.state, j))
+                self.put(acked, i, self.bit(self.acked, j))
+            node.value = float(self.bit(state, i))
+        self.state = state
+        self.acked = acked
+        self.disabled = self.bits([not node.enabled for node in self.nodes])
+        self.disabled_count = sum(not node.enabled for node in self.nodes)
+        self.sources = [node.source for node in self.nodes]
+        self.quality = np.fromiter(map(attrgetter("quality"), self.nodes), np.uint16, n)
+
+        self.on_lo = np.empty(n)
+        self.on_hi = np.empty(n)
+        self.off_lo = np.empty(n)
+        self.off_hi = np.empty(n)
+        self.dynamic = []
+        for i, node in enumerate(self.nodes):
+            self.band(i, node)
+            if any(isinstance(getattr(node, ref), PaeNode) for ref in ("threshold", "min_limit", "max_limit")):
+                self.dynamic.append((i, node))
+        self.transitions = []
+
+    def band(self, i: int, node: PaeNode) -> None:
+        h = node.hysteresis
+        if node.type == PaeType.Alarm_above:
+            lo, hi = node.get(node.threshold), math.inf
+        elif node.type == PaeType.Alarm_below:
+            lo, hi = -math.inf, node.get(node.threshold)
+        else:
+            lo, hi = node.get(node.min_limit), node.get(node.max_limit)
+        self.on_lo[i] = lo
+        self.on_hi[i] = hi
+        self.off_lo[i] = lo - h
+        self.off_hi[i] = hi + h
+
+    @staticmethod
+    def bits(flags) -> np.ndarray:
+        return np.packbits(np.asarray(flags, dtype=bool))
+
+    @staticmethod
+    def bit(bits: np.ndarray, i: int) -> bool:
+        return bool(bits[i >> 3] & (0x80 >> (i & 7)))
+
+    @staticmethod
+    def put(bits: np.ndarray, i: int, on: bool) -> None:
+        mask = 0x80 >> (i & 7)
+        if on:
+            bits[i >> 3] |= mask
+        else:
+            bits[i >> 3] &= 0xFF ^ mask
+
+    @staticmethod
+    def positions(bits: np.ndarray) -> np.ndarray:
+        # Indices of the set bits, only the non-zero bytes are unpacked
+        where = np.flatnonzero(bits)
+        rows, cols = np.nonzero(np.unpackbits(bits[where]).reshape(-1, 8))
+        return where[rows] * 8 + cols
+
+    def set_value(self, node: PaeNode, value: float) -> None:
+        # The value of an alarm is its state
+        pass
+
+    def set_enabled(self, node: PaeNode, en: bool) -> None:
+        # A disabled alarm keeps its state
+        i = self.index[id(node)]
+        if self.bit(self.disabled, i) == en:
+            self.put(self.disabled, i, not en)
+            self.disabled_count += -1 if en else 1
+
+    def listen(self, callback) -> None:
+        # callback(events) is called once for every tick with transitions
+        self.listeners.append(callback)
+
+    def update(self) -> None:
+        if self.transitions:
+            self.transitions = []
+        n = len(self.nodes)
+        if n == 0:
+            return
+        for i, node in self.dynamic:
+            self.band(i, node)
+
+        x = np.fromiter(map(attrgetter("value"), self.sources), float, n)
+        quality = np.fromiter(map(attrgetter("quality"), self.sources), np.uint16, n)
+        moved = np.flatnonzero(quality != self.quality)
+        if len(moved):
+            self.quality = quality
+            for i in moved.tolist():
+                node = self.nodes[i]
+                node.inherited = int(quality[i])
+                node.quality = node.status | node.inherited
+        with np.errstate(invalid="ignore"):
+            # NaN is neither, the alarm keeps its state
+            on = np.packbits((x > self.on_lo) & (x < self.on_hi))
+            off = np.packbits((x <= self.off_lo) | (x >= self.off_hi))
+
+        state = self.state
+        new = (state & ~off) | on
+        if self.disabled_count:
+            new = (new & ~self.disabled) | (state & self.disabled)
+        changed = state ^ new
+        if not changed.any():
+            return
+        self.state = new
+
+        motor = self.motor
+        events = []
+        for i in self.positions(changed).tolist():
+            node = self.nodes[i]
+            if self.bit(new, i):
+                node.value = 1.0
+                self.put(self.acked, i, False)
+                type = PaeEventType.AlarmOn
+            else:
+                node.value = 0.0
+                type = PaeEventType.AlarmOff
+            events.append(PaeEvent(type, node, motor.tick))
+            motor.emit(node, type)
+        self.transitions = events
+        for callback in self.listeners:
+            callback(events)
+
+    def acknowledge(self, node: PaeNode) -> None:
+        # From other threads through motor.post()
+        i = self.index[id(node)]
+        if not self.bit(self.acked, i):
+            self.put(self.acked, i, True)
+            self.motor.emit(node, PaeEventType.Acknowledged)
+
+    def acknowledge_all(self) -> None:
+        for i in self.positions(self.unacked_bits()).tolist():
+            self.acknowledge(self.nodes[i])
+
+    def unacked_bits(self) -> np.ndarray:
+        # Padding bits are set in ~acked, they are cleared here
+        bits = ~self.acked
+        n = len(self.nodes)
+        if n % 8:
+            bits[-1] &= 0xFF << (8 - n % 8) & 0xFF
+        return bits
+
+    def active(self) -> list:
+        return [self.nodes[i] for i in self.positions(self.state).tolist()]
+
+    def unacknowledged(self) -> list:
+        # Active or not, an alarm stays unacknowledged until acknowledged
+        return [self.nodes[i] for i in self.positions(self.unacked_bits()).tolist()]
+
+    def count(self, evaluations: dict) -> None:
+        for node in self.nodes:
+            if node.enabled:
+                evaluations[node.type] = evaluations.get(node.type, 0) + 1
+
+
+def main() -> None:
+    import time
+
+    motor = PaeMotor()
+    n = 10000
+    for i in range(n):
+        motor.add_node(PaeNode(type=PaeType.Random, id=f"t{i}", factor=100.0))
+        motor.add_node(PaeNode(type=PaeType.Alarm_above, id=f"t{i}.high", source=f"t{i}", threshold=99.0, hysteresis=5.0))
+    motor.initiate()
+    alarms = motor.alarms
+
+    changes = []
+    alarms.listen(lambda events: changes.append(len(events)))
+    start = time.perf_counter()
+    for _ in range(100):
+        motor.update()
+    elapsed = (time.perf_counter() - start) * 10
+    print(f"{elapsed:.2f} ms per tick for {n} alarms, {sum(changes) / len(changes):.0f} transitions per tick")
+    print(f"{len(alarms.active())} active, {len(alarms.unacknowledged())} unacknowledged")
+    alarms.acknowledge_all()
+    print(f"{len(alarms.active())} active, {len(alarms.unacknowledged())} unacknowledged after acknowledge")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+#
+# SQLite archive for Pae
+#
+# File:     paearchive.py
+# Author:   Peter Malmberg  <peter.malmberg@gmail.com>
+# Org:      __ORGANISTATION__
+# Date:     2026-10-19
+# License:  MIT
+# Python:   >= 3.8
+#
+# ----------------------------------------------------------------------------
+#
+# Raw samples are kept in "samples" for the retention time of the first tier.
+# Only changes are stored, a sample holds its value until the next sample of
+# the node. Older samples are downsampled into min/max/sum/span buckets of the
+# next tier, and so on, where sum is the integral of the value over the span
+# seconds of the bucket it was known. Averages are weighted by time, so a
+# value held for a long time counts for that time. Every table is keyed on
+# (node, t) so a range query for one node is a single index range scan, and an
+# index on t keeps retention cheap.
+#
+# Samples are collected on the motor thread and written from a background
+# thread in one transaction every commit interval, using multi-row inserts.
+#
+
+from __future__ import annotations
+from itertools import groupby, repeat
+from operator import itemgetter
+import math
+import sqlite3
+import threading
+import time
+import logging
+
+import numpy as np
+
+from pae import PaeDriver
+
+# (resolution in seconds, retention in seconds), resolution 0 is raw samples
+# and a retention of None keeps data forever
+DEFAULT_TIERS = (
+    (0, 2 * 86400),
+    (60, 60 * 86400),
+    (3600, None),
+)
+
+CHUNK = 256
+
+
+def table(resolution: int) -> str:
+    return "samples" if resolution == 0 else f"buckets_{resolution}"
+
+
+def accumulate(buckets: dict, t: float, mn: float, mx: float, s: float, span: float) -> None:
+    acc = buckets.get(t)
+    if acc is None:
+        buckets[t] = [mn, mx, s, span]
+    else:
+        acc[0] = min(acc[0], mn)
+        acc[1] = max(acc[1], mx)
+        acc[2] += s
+        acc[3] += span
+
+
+def spread(samples: list, end: float, resolution: float, buckets: dict = None) -> dict:
+    # Time weighted buckets {start: [min, max, sum, span]} of (t, value)
+    # samples in time order, each value held until the next sample and the
+    # last one until end. NaN values, None from SQLite, are left out.
+    if buckets is None:
+        buckets = {}
+    for i, (t, value) in enumerate(samples):
+        stop = samples[i + 1][0] if i + 1 < len(samples) else end
+        if value is None or math.isnan(value):
+            continue
+        k = math.floor(t / resolution)
+        while t < stop:
+            e = min(stop, (k + 1) * resolution)
+            if e > t:
+                accumulate(buckets, k * resolution, value, value, value * (e - t), e - t)
+            t = e
+            k += 1
+    return buckets
+
+
+class PaeArchive(PaeDriver):
+    def __init__(
+        self,
+        path: str,
+        ids: list = None,
+        tiers: tuple = DEFAULT_TIERS,
+        commit_interval: float = 1.0,
+        retention_interval: float = 60.0,
+    ) -> None:
+        super().__init__()
+        self.path = path
+        self.ids = ids
+        self.tiers = tiers
+        self.commit_interval = commit_interval
+        self.retention_interval = retention_interval
+        self.index = None
+        self.node_keys = []
+        self.last = None
+        self.latest = 0.0
+        self.pending = []
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.thread = None
+        self.local = threading.local()
+        self.inserts = {}
+
+        db = self.connect()
+        self.create(db)
+        db.close()
+
+    def connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def create(self, db: sqlite3.Connection) -> None:
+        db.execute("CREATE TABLE IF NOT EXISTS nodes (key INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL)")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS samples "
+            "(node INTEGER, t REAL, value REAL, PRIMARY KEY (node, t)) WITHOUT ROWID"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS samples_t ON samples (t)")
+        for resolution, _ in self.tiers[1:]:
+            name = table(resolution)
+            db.execute(
+                f"CREATE TABLE IF NOT EXISTS {name} "
+                "(node INTEGER, t REAL, min REAL, max REAL, sum REAL, span REAL, "
+                "PRIMARY KEY (node, t)) WITHOUT ROWID"
+            )
+            db.execute(f"CREATE INDEX IF NOT EXISTS {name}_t ON {name} (t)")
+
+    def node_key(self, db: sqlite3.Connection, id: str) -> int:
+        db.execute("INSERT OR IGNORE INTO nodes (id) VALUES (?)", (id,))
+        return db.execute("SELECT key FROM nodes WHERE id = ?", (id,)).fetchone()[0]
+
+    def start(self) -> PaeArchive:
+        self.select_nodes(self.ids, vectors=False)
+
+        db = self.connect()
+        self.node_keys = np.array([self.node_key(db, node.id) for node in self.nodes], dtype=np.int64)
+        db.close()
+        self.index = np.array([node.index for node in self.nodes], dtype=np.intp)
+        self.last = None
+
+        self.thread = threading.Thread(target=self.writer, name="pae-archive", daemon=True)
+        self.thread.start()
+        return self
+
+    def output(self) -> None:
+        if self.thread is None:
+            self.start()
+
+        snap = self.motor.snapshot()
+        values = snap.values[self.index]
+        if self.last is None:
+            changed = np.arange(len(values))
+        else:
+            # NaN is not equal to itself, a NaN held is no change
+            same = (values == self.last) | (np.isnan(values) & np.isnan(self.last))
+            changed = np.flatnonzero(~same)
+        self.last = values
+        self.latest = snap.time
+        if changed.size:
+            rows = zip(self.node_keys[changed].tolist(), repeat(snap.time), values[changed].tolist())
+            with self.lock:
+                self.pending.extend(rows)
+
+    def insert_sql(self, rows: int) -> str:
+        sql = self.inserts.get(rows)
+        if sql is None:
+            values = ",".join(["(?,?,?)"] * rows)
+            sql = f"INSERT OR REPLACE INTO samples (node, t, value) VALUES {values}"
+            self.inserts[rows] = sql
+        return sql
+
+    def write(self, db: sqlite3.Connection, rows: list) -> None:
+        db.execute("BEGIN")
+        for start in range(0, len(rows), CHUNK):
+            chunk = rows[start: start + CHUNK]
+            db.execute(self.insert_sql(len(chunk)), [v for row in chunk for v in row])
+        db.execute("COMMIT")
+
+    def downsample(self, db: sqlite3.Connection, now: float) -> None:
+        db.execute("BEGIN")
+        for (resolution, retention), (target, _) in zip(self.tiers, self.tiers[1:]):
+            if retention is None:
+                continue
+            limit = (now - retention) // target * target
+            if resolution == 0:
+                self.downsample_samples(db, limit, target)
+                continue
+            source = table(resolution)
+            db.execute(
+                f"INSERT INTO {table(target)} (node, t, min, max, sum, span) "
+                f"SELECT node, CAST(t / {target} AS INTEGER) * {target} AS bucket, "
+                f"MIN(min), MAX(max), SUM(sum), SUM(span) "
+                f"FROM {source} WHERE t < ? GROUP BY node, bucket "
+                "ON CONFLICT (node, t) DO UPDATE SET "
+                "min = MIN(min, excluded.min), max = MAX(max, excluded.max), "
+                "sum = sum + excluded.sum, span = span + excluded.span",
+                (limit,),
+            )
+            db.execute(f"DELETE FROM {source} WHERE t < ?", (limit,))
+
+        resolution, retention = self.tiers[-1]
+        if retention is not None:
+            db.execute(f"DELETE FROM {table(resolution)} WHERE t < ?", (now - retention,))
+        db.execute("COMMIT")
+
+    def downsample_samples(self, db: sqlite3.Connection, limit: float, target: int) -> None:
+        # The samples before limit are held until the next one or limit, the
+        # value held at limit is kept as a sample there
+        rows = db.execute("SELECT node, t, value FROM samples WHERE t < ? ORDER BY node, t", (limit,)).fetchall()
+        updates = []
+        held = []
+        for node, group in groupby(rows, itemgetter(0)):
+            samples = [(t, value) for _, t, value in group]
+            buckets = spread(samples, limit, target)
+            updates += [(node, t, *acc) for t, acc in buckets.items()]
+            held.append((node, limit, samples[-1][1]))
+        db.executemany("INSERT OR IGNORE INTO samples (node, t, value) VALUES (?, ?, ?)", held)
+        db.executemany(
+            f"INSERT INTO {table(target)} (node, t, min, max, sum, span) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (node, t) DO UPDATE SET "
+            "min = MIN(min, excluded.min), max = MAX(max, excluded.max), "
+            "sum = sum + excluded.sum, span = span + excluded.span",
+            updates,
+        )
+        db.execute("DELETE FROM samples WHERE t < ?", (limit,))
+
+    def writer(self) -> None:
+        db = self.connect()
+        next_retention = 0.0
+        while True:
+            stopping = self.stop.wait(self.commit_interval)
+            with self.lock:
+                rows, self.pending = self.pending, []
+            try:
+                if rows:
+                    self.write(db, rows)
+                now = time.time()
+                if now >= next_retention:
+                    self.downsample(db, now)
+                    next_retention = now + self.retention_interval
+            except sqlite3.Error as e:
+                logging.error(f"Archive write failed: {e}")
+                if db.in_transaction:
+                    db.execute("ROLLBACK")
+            if stopping:
+                break
+        db.close()
+
+    def reader(self) -> sqlite3.Connection:
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = self.connect()
+            self.local.db = db
+        return db
+
+    def query(self, id: str, t0: float, t1: float, resolution: float = 0) -> list:
+        # Returns (t, value) rows for resolution 0, the value held at t0
+        # first, otherwise (bucket start, average, min, max) rows with
+        # buckets of resolution seconds, weighted by time. Downsampled data
+        # is used where raw samples are gone.
+        db = self.reader()
+        row = db.execute("SELECT key FROM nodes WHERE id = ?", (id,)).fetchone()
+        if row is None:
+            return []
+        key = row[0]
+
+        parts = [
+            f"SELECT t, min, max, sum, span FROM {table(res)} WHERE node = ? AND t >= ? AND t < ?"
+            for res, _ in self.tiers[1:]
+        ]
+        downsampled = []
+        if parts:
+            sql = " UNION ALL ".join(parts) + " ORDER BY t"
+            downsampled = db.execute(sql, (key, t0, t1) * len(parts)).fetchall()
+        samples = db.execute(
+            "SELECT t, value FROM samples WHERE node = ? AND t >= ? AND t < ? ORDER BY t", (key, t0, t1)
+        ).fetchall()
+        held = db.execute(
+            "SELECT value FROM samples WHERE node = ? AND t < ? ORDER BY t DESC LIMIT 1", (key, t0)
+        ).fetchone()
+        if held is not None:
+            samples.insert(0, (t0, held[0]))
+
+        if resolution <= 0:
+            # Raw samples are all later than the downsampled data
+            return [(t, s / span if span else None) for t, _, _, s, span in downsampled] + samples
+
+        # The last sample holds until the latest tick archived
+        end = min(t1, self.latest or time.time())
+        buckets = spread(samples, end, resolution)
+        for t, mn, mx, s, span in downsampled:
+            if span:
+                accumulate(buckets, math.floor(t / resolution) * resolution, mn, mx, s, span)
+        return [(t, s / span, mn, mx) for t, (mn, mx, s, span) in sorted(buckets.items()) if span]
+
+    def close(self) -> None:
+        if self.thread is None:
+            return
+        self.stop.set()
+        self.thread.join()
+        self.thread = None
+        self.release_nodes()
+
+
+def main() -> None:
+    import sys
+    from pae import PaeMotor, PaeNode, PaeType
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "pae.db"
+
+    motor = PaeMotor()
+    motor.add_node(PaeNode(type=PaeType.Sine, id="sin"))
+    motor.add_node(PaeNode(type=PaeType.Random, id="rnd"))
+    motor.initiate()
+    archive = motor.add_driver(PaeArchive(path, commit_interval=0.2))
+    start = time.time()
+    for _ in range(50):
+        motor.update()
+        time.sleep(0.02)
+    motor.close()
+
+    for row in archive.query("sin", start, time.time() + 1, 0.25):
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+#
+# Expressions for Pae
+#
+# File:     paeexpr.py
+# Author:   Peter Malmberg  <peter.malmberg@gmail.com>
+# Org:      __ORGANISTATION__
+# Date:     2026-10-19
+# License:  MIT
+# Python:   >= 3.8
+#
+# ----------------------------------------------------------------------------
+#
+# Formulas like "(a * b + c) / d" where names are node ids. The formula is
+# parsed once with ast, checked against a small grammar (arithmetic,
+# comparisons, and/or/not, conditional expressions, numbers and a fixed set of
+# functions) and compiled to a code object that reads node values from a list.
+#
+# A second code object evaluates the same formula over numpy arrays, with
+# conditionals and logic rewritten into their element-wise equivalents.
+#
+
+from __future__ import annotations
+import ast
+from copy import deepcopy
+from functools import reduce
+import math
+
+FUNCTIONS = {
+    "abs": abs,
+    "min": min,
+    "max": max,
+    "sqrt": math.sqrt,
+    "exp": math.exp,
+    "log": math.log,
+    "log10": math.log10,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "atan2": math.atan2,
+    "floor": math.floor,
+    "ceil": math.ceil,
+}
+
+# Number of arguments, as (least, most), None for no limit
+ARGUMENTS = {
+    "abs": (1, 1),
+    "min": (2, None),
+    "max": (2, None),
+    "sqrt": (1, 1),
+    "exp": (1, 1),
+    "log": (1, 2),
+    "log10": (1, 1),
+    "sin": (1, 1),
+    "cos": (1, 1),
+    "tan": (1, 1),
+    "atan2": (2, 2),
+    "floor": (1, 1),
+    "ceil": (1, 1),
+}
+
+CONSTANTS = {
+    "pi": math.pi,
+    "e": math.e,
+}
+
+NODES = (
+    ast.Expression,
+    ast.BinOp,
+    ast.UnaryOp,
+    ast.BoolOp,
+    ast.Compare,
+    ast.IfExp,
+    ast.Call,
+    ast.Name,
+    ast.Attribute,
+    ast.Constant,
+    ast.Load,
+    ast.Add,
+    ast.Sub,
+    ast.Mult,
+    ast.Div,
+    ast.FloorDiv,
+    ast.Mod,
+    ast.Pow,
+    ast.USub,
+    ast.UAdd,
+    ast.Not,
+    ast.And,
+    ast.Or,
+    ast.Eq,
+    ast.NotEq,
+    ast.Lt,
+    ast.LtE,
+    ast.Gt,
+    ast.GtE,
+)
+
+
+class PaeExpressionError(ValueError):
+    pass
+
+
+def dotted(node: ast.AST) -> str:
+    # "a.b.c" names are allowed as node ids
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        base = dotted(node.value)
+        if base is not None:
+            return f"{base}.{node.attr}"
+    return None
+
+
+class Resolver(ast.NodeTransformer):
+    # Replaces node ids with _v[i] and collects the ids in order
+
+    def __init__(self) -> None:
+        self.names = []
+
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+    def reference(self, name: str, node: ast.AST) -> ast.AST:
+        if name in CONSTANTS:
+            return ast.copy_location(ast.Constant(CONSTANTS[name]), node)
+        if name not in self.names:
+            self.names.append(name)
+        index = ast.Constant(self.names.index(name))
+        return ast.copy_location(ast.Subscript(ast.Name("_v", ast.Load()), index, ast.Load()), node)
+
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        return self.reference(node.id, node)
+
+    def visit_Constant(self, node: ast.Constant) -> ast.AST:
+        # Integer powers like 9 ** 9 ** 9 would be computed exactly without
+        # end, in floats they overflow at once
+        if type(node.value) is int:
+            return ast.copy_location(ast.Constant(float(node.value)), node)
+        return node
+
+    def visit_Attribute(self, node: ast.Attribute) -> ast.AST:
+        return self.reference(dotted(node), node)
+
+
+class Vectorizer(ast.NodeTransformer):
+    # Rewrites constructs that do not work on arrays into numpy calls
+
+    def call(self, name: str, args: list, node: ast.AST) -> ast.AST:
+        return ast.copy_location(ast.Call(ast.Name(name, ast.Load()), args, []), node)
+
+    def visit_IfExp(self, node: ast.IfExp) -> ast.AST:
+        self.generic_visit(node)
+        return self.call("_where", [node.test, node.body, node.orelse], node)
+
+    def visit_BoolOp(self, node: ast.BoolOp) -> ast.AST:
+        self.generic_visit(node)
+        name = "_and" if isinstance(node.op, ast.And) else "_or"
+        return self.call(name, node.values, node)
+
+    def visit_UnaryOp(self, node: ast.UnaryOp) -> ast.AST:
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return self.call("_not", [node.operand], node)
+        return node
+
+    def visit_Compare(self, node: ast.Compare) -> ast.AST:
+        self.generic_visit(node)
+        if len(node.ops) == 1:
+            return node
+        left = node.left
+        pairs = []
+        for op, right in zip(node.ops, node.comparators):
+            pairs.append(ast.Compare(left, [op], [right]))
+            left = right
+        return self.call("_and", pairs, node)
+
+
+def vector_functions() -> dict:
+    import numpy as np
+
+    return {
+        "abs": np.abs,
+        "min": lambda *a: reduce(np.minimum, a),
+        "max": lambda *a: reduce(np.maximum, a),
+        "sqrt": np.sqrt,
+        "exp": np.exp,
+        "log": lambda x, *base: np.log(x) / np.log(base[0]) if base else np.log(x),
+        "log10": np.log10,
+        "sin": np.sin,
+        "cos": np.cos,
+        "tan": np.tan,
+        "atan2": np.arctan2,
+        "floor": np.floor,
+        "ceil": np.ceil,
+        "_where": np.where,
+        "_and": lambda *a: reduce(np.logical_and, a),
+        "_or": lambda *a: reduce(np.logical_or, a),
+        "_not": np.logical_not,
+    }
+
+
+class PaeExpression:
+    def __init__(self, text: str) -> None:
+        self.text = text
+        try:
+            tree = ast.parse(text.strip(), mode="eval")
+        except SyntaxError as e:
+            raise PaeExpressionError(f"Syntax error in expression {text!r}: {e.msg}") from None
+
+        self.check(tree)
+        resolver = Resolver()
+        tree = ast.fix_missing_locations(resolver.visit(tree))
+        self.names = resolver.names
+        self.code = compile(tree, "<expression>", "eval")
+        self.env = {"__builtins__": {}, **FUNCTIONS}
+
+        vector_tree = ast.fix_missing_locations(Vectorizer().visit(deepcopy(tree)))
+        self.vector_code = compile(vector_tree, "<expression>", "eval")
+        self.vector_env = None
+
+    def check(self, tree: ast.AST) -> None:
+        for node in ast.walk(tree):
+            if not isinstance(node, NODES):
+                raise PaeExpressionError(f"{type(node).__name__} not allowed in expression {self.text!r}")
+            if isinstance(node, ast.Constant) and type(node.value) not in (int, float, bool):
+                raise PaeExpressionError(f"Constant {node.value!r} not allowed in expression {self.text!r}")
+            if isinstance(node, ast.Attribute) and dotted(node) is None:
+                raise PaeExpressionError(f"Attribute access not allowed in expression {self.text!r}")
+            if isinstance(node, ast.Call):
+                if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+                    raise PaeExpressionError(f"Unknown function in expression {self.text!r}")
+                if node.keywords:
+                    raise PaeExpressionError(f"Keyword arguments not allowed in expression {self.text!r}")
+                least, most = ARGUMENTS[node.func.id]
+                if len(node.args) < least or most is not None and len(node.args) > most:
+                    raise PaeExpressionError(
+                        f"Wrong number of arguments to {node.func.id} in expression {self.text!r}"
+                    )
+
+    def evaluate(self, values: list) -> float:
+        env = self.env
+        env["_v"] = values
+        return eval(self.code, env)
+
+    def evaluate_batch(self, columns) -> object:
+        # columns is a dict of node id to numpy array, or a list of arrays in
+        # the order of self.names
+        import numpy as np
+
+        if self.vector_env is None:
+            self.vector_env = {"__builtins__": {}, **vector_functions()}
+        if isinstance(columns, dict):
+            columns = [columns[name] for name in self.names]
+        env = self.vector_env
+        env["_v"] = columns
+        # Both branches of a conditional are computed, errors in the one not
+        # selected must not warn
+        with np.errstate(all="ignore"):
+            return eval(self.vector_code, env)
+
+    def __str__(self) -> str:
+        return self.text
+
+
+def main() -> None:
+    import numpy as np
+
+    expr = PaeExpression("(a * b + c) / d if d != 0 else 0")
+    # Values are passed in the order of expr.names
+    for values in ({"a": 2.0, "b": 3.0, "c": 4.0, "d": 5.0}, {"a": 2.0, "b": 3.0, "c": 4.0, "d": 0.0}):
+        print(values, expr.evaluate([values[name] for name in expr.names]))
+    a = np.arange(5.0)
+    print(expr.evaluate_batch({"a": a, "b": a, "c": 1.0, "d": a - 2}))
+
+
+if __name__ == "__main__":
+    main()
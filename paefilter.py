@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+#
+# Streaming filters for Pae
+#
+# File:     paefilter.py
+# Author:   Peter Malmberg  <peter.malmberg@gmail.com>
+# Org:      __ORGANISTATION__
+# Date:     2026-10-19
+# License:  MIT
+# Python:   >= 3.8
+#
+# ----------------------------------------------------------------------------
+#
+# Filters that keep a fixed amount of state per node, whatever the length of
+# the signal:
+#
+#   PaeP2Quantile      quantile estimate over all samples, P-square algorithm
+#                      (Jain and Chlamtac), five markers
+#   PaeWindowQuantile  exact quantile of the last n samples, the window is kept
+#                      sorted in an indexable skiplist, O(log n) per sample
+#   PaeWindowExtreme   min or max of the last n samples or of the samples of
+#                      the last span seconds, monotonic deque, O(1) amortized
+#
+# update() takes the next sample and returns the new filter value.
+# PaeWindowExtreme.block() does the same for an array of samples with numpy.
+#
+
+from __future__ import annotations
+from bisect import bisect_right, insort
+from collections import deque
+import math
+import random
+import time
+
+import numpy as np
+
+
+class PaeP2Quantile:
+    def __init__(self, quantile: float = 0.5) -> None:
+        if not 0.0 <= quantile <= 1.0:
+            raise ValueError(f"Quantile {quantile} not in [0, 1]")
+        p = quantile
+        self.p = p
+        self.q = []
+        self.n = [0, 1, 2, 3, 4]
+        self.desired = [0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0]
+        self.increment = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    def update(self, x: float) -> float:
+        q = self.q
+        if len(q) < 5:
+            insort(q, x)
+            return interpolate(q, self.p)
+
+        n = self.n
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = bisect_right(q, x) - 1
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        desired = self.desired
+        for i in range(5):
+            desired[i] += self.increment[i]
+
+        # Move the middle markers towards their desired positions
+        for i in (1, 2, 3):
+            d = desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                h = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not q[i - 1] < h < q[i + 1]:
+                    h = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = h
+                n[i] += d
+
+        return q[2]
+
+
+def interpolate(data, p: float) -> float:
+    # Quantile p of the sorted sequence data, linear between ranks
+    rank = p * (len(data) - 1)
+    lo = math.floor(rank)
+    hi = min(lo + 1, len(data) - 1)
+    return data[lo] + (data[hi] - data[lo]) * (rank - lo)
+
+
+class End:
+    # Value of the terminating link, greater than everything
+    def __lt__(self, other) -> bool:
+        return False
+
+    def __le__(self, other) -> bool:
+        return False
+
+
+class Link:
+    __slots__ = ("value", "next", "width")
+
+    def __init__(self, value, next: list, width: list) -> None:
+        self.value = value
+        self.next = next
+        self.width = width
+
+
+NIL = Link(End(), [], [])
+
+
+class PaeSkiplist:
+    # Sorted multiset with insert, remove and lookup by rank in O(log n).
+    # Every link stores how many items it skips, so indexing can walk the
+    # upper levels.
+
+    def __init__(self, size: int = 100, seed: int = 0) -> None:
+        self.size = 0
+        self.levels = int(1 + math.log2(max(size, 2)))
+        self.head = Link(None, [NIL] * self.levels, [1] * self.levels)
+        self.random = random.Random(seed)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, i: int) -> float:
+        if not 0 <= i < self.size:
+            raise IndexError(i)
+        link = self.head
+        i += 1
+        for level in reversed(range(self.levels)):
+            while link.width[level] <= i:
+                i -= link.width[level]
+                link = link.next[level]
+        return link.value
+
+    def insert(self, value: float) -> None:
+        chain = [None] * self.levels
+        steps = [0] * self.levels
+        link = self.head
+        for level in reversed(range(self.levels)):
+            while link.next[level].value <= value:
+                steps[level] += link.width[level]
+                link = link.next[level]
+            chain[level] = link
+
+        d = 1
+        while d < self.levels and self.random.random() < 0.5:
+            d += 1
+        new = Link(value, [None] * d, [None] * d)
+        skipped = 0
+        for level in range(d):
+            prev = chain[level]
+            new.next[level] = prev.next[level]
+            prev.next[level] = new
+            new.width[level] = prev.width[level] - skipped
+            prev.width[level] = skipped + 1
+            skipped += steps[level]
+        for level in range(d, self.levels):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, value: float) -> None:
+        chain = [None] * self.levels
+        link = self.head
+        for level in reversed(range(self.levels)):
+            while link.next[level].value < value:
+                link = link.next[level]
+            chain[level] = link
+        if chain[0].next[0] is NIL or chain[0].next[0].value != value:
+            raise KeyError(value)
+
+        d = len(chain[0].next[0].next)
+        for level in range(d):
+            prev = chain[level]
+            prev.width[level] += prev.next[level].width[level] - 1
+            prev.next[level] = prev.next[level].next[level]
+        for level in range(d, self.levels):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+
+class PaeWindowQuantile:
+    def __init__(self, window: int = 100, quantile: float = 0.5) -> None:
+        if window < 1:
+            raise ValueError(f"Window {window} must be at least 1")
+        if not 0.0 <= quantile <= 1.0:
+            raise ValueError(f"Quantile {quantile} not in [0, 1]")
+        self.window = window
+        self.p = quantile
+        self.samples = deque()
+        self.sorted = PaeSkiplist(window)
+
+    def update(self, x: float) -> float:
+        if x != x:
+            # NaN has no place in the order, keep the last value
+            return interpolate(self.sorted, self.p) if self.samples else x
+        self.samples.append(x)
+        self.sorted.insert(x)
+        if len(self.samples) > self.window:
+            self.sorted.remove(self.samples.popleft())
+        return interpolate(self.sorted, self.p)
+
+
+class PaeWindowExtreme:
+    # The deque holds (key, value) of the samples that can still become the
+    # extreme: values strictly decreasing (max) or increasing (min) from the
+    # front. Keys are sample numbers, or times when span is given.
+
+    def __init__(self, window: int = 100, span: float = 0.0, maximum: bool = True) -> None:
+        if span <= 0 and window < 1:
+            raise ValueError(f"Window {window} must be at least 1")
+        self.window = window
+        self.span = span
+        self.maximum = maximum
+        self.op = np.maximum if maximum else np.minimum
+        self.fill = -math.inf if maximum else math.inf
+        self.deque = deque()
+        self.count = 0
+
+    def update(self, x: float, now: float = None) -> float:
+        dq = self.deque
+        if self.span > 0:
+            key = time.monotonic() if now is None else now
+        else:
+            key = self.count
+        self.count += 1
+
+        if self.maximum:
+            while dq and dq[-1][1] <= x:
+                dq.pop()
+        else:
+            while dq and dq[-1][1] >= x:
+                dq.pop()
+        dq.append((key, x))
+
+        if self.span > 0:
+            limit = key - self.span
+            while dq[0][0] < limit:
+                dq.popleft()
+        else:
+            limit = key - self.window
+            while dq[0][0] <= limit:
+                dq.popleft()
+        return dq[0][1]
+
+    def block(self, values, times=None) -> np.ndarray:
+        # update() for every sample of values, times are needed with a span
+        x = np.asarray(values, dtype=float)
+        n = len(x)
+        if n == 0:
+            return x.copy()
+        keys = np.array([k for k, _ in self.deque], dtype=float)
+        kept = np.array([v for _, v in self.deque], dtype=float)
+
+        if self.span > 0:
+            if times is None:
+                raise ValueError("Window with span needs sample times")
+            t = np.asarray(times, dtype=float)
+            keys = np.concatenate((keys, t))
+            data = np.concatenate((kept, x))
+            # Reduce data[start:end] for every sample, reduceat needs the
+            # pairs interleaved and a valid index after the last end
+            starts = np.searchsorted(keys, t - self.span, side="left")
+            ends = len(kept) + np.arange(1, n + 1)
+            pairs = np.empty(2 * n, dtype=np.intp)
+            pairs[0::2] = starts
+            pairs[1::2] = ends
+            out = self.op.reduceat(np.append(data, self.fill), pairs)[0::2]
+            tail = keys >= t[-1] - self.span
+        else:
+            # Every sample in the deque is the extreme of all samples from
+            # its own up to the newest, the others can be left out
+            w = self.window
+            carry = np.full(w - 1, self.fill)
+            pos = (keys - (self.count - (w - 1))).astype(np.intp)
+            carry[pos[pos >= 0]] = kept[pos >= 0]
+            data = np.concatenate((carry, x))
+            out = sliding_extreme(data, w, self.op, self.fill)[:n]
+            keys = np.arange(self.count - (w - 1), self.count + n, dtype=float)
+            tail = (keys > self.count + n - 1 - w) & (data != self.fill)
+
+        self.count += n
+        self.rebuild(keys[tail], data[tail])
+        return out
+
+    def rebuild(self, keys: np.ndarray, data: np.ndarray) -> None:
+        # Keep the samples that are strictly beyond all later ones
+        later = np.append(self.op.accumulate(data[::-1])[::-1][1:], self.fill)
+        if self.maximum:
+            keep = data > later
+        else:
+            keep = data < later
+        self.deque = deque(zip(keys[keep].tolist(), data[keep].tolist()))
+
+
+def sliding_extreme(x: np.ndarray, w: int, op, fill: float) -> np.ndarray:
+    # op over x[i:i + w] for i = 0 .. len(x) - w, van Herk/Gil-Werman: the
+    # extreme of a window is that of the end of one chunk of w samples and the
+    # start of the next, both from running extremes within the chunks
+    n = len(x) - w + 1
+    chunks = -(-len(x) // w)
+    padded = np.full(chunks * w, fill)
+    padded[: len(x)] = x
+    r = padded.reshape(chunks, w)
+    prefix = op.accumulate(r, axis=1).ravel()
+    suffix = op.accumulate(r[:, ::-1], axis=1)[:, ::-1].ravel()
+    return op(suffix[:n], prefix[w - 1: w - 1 + n])
+
+
+def main() -> None:
+    import numpy as np
+
+    data = np.random.default_rng(1).normal(size=100000).tolist()
+    for p in (0.5, 0.95, 0.99):
+        f = PaeP2Quantile(p)
+        for x in data:
+            v = f.update(x)
+        print(f"p{p * 100:g}: P2 {v:.4f} exact {np.quantile(data, p):.4f}")
+
+    f = PaeWindowQuantile(1000, 0.95)
+    start = time.perf_counter()
+    for x in data:
+        v = f.update(x)
+    elapsed = time.perf_counter() - start
+    print(f"window p95: {v:.4f} exact {np.quantile(data[-1000:], 0.95):.4f}, {elapsed / len(data) * 1e6:.1f} us per sample")
+
+    f = PaeWindowExtreme(1000)
+    start = time.perf_counter()
+    out = np.concatenate([f.block(data[i: i + 4096]) for i in range(0, len(data), 4096)])
+    elapsed = time.perf_counter() - start
+    print(f"window max: {out[-1]:.4f} exact {max(data[-1000:]):.4f}, {elapsed / len(data) * 1e9:.0f} ns per sample in blocks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+#
+# Block generated sources for Pae
+#
+# File:     paegen.py
+# Author:   Peter Malmberg  <peter.malmberg@gmail.com>
+# Org:      __ORGANISTATION__
+# Date:     2026-10-19
+# License:  MIT
+# Python:   >= 3.8
+#
+# ----------------------------------------------------------------------------
+#
+# Random sources that compute their samples a block at a time with numpy and
+# hand them out one per tick. They use their own seeded generator, so runs
+# are reproducible and nodes do not share state. Waveforms are computed from
+# the motor time by the nodes themselves.
+#
+
+from __future__ import annotations
+import zlib
+
+import numpy as np
+
+BLOCK = 4096
+
+
+def node_seed(id: str, index: int = 0) -> int:
+    # Stable over runs, unlike hash()
+    return zlib.crc32(f"{id}:{index}".encode())
+
+
+class PaeRandomSource:
+    # Uniform samples in [0, 1)
+
+    def __init__(self, seed: int, block: int = BLOCK) -> None:
+        self.block = block
+        self.data = []
+        self.pos = 0
+        self.rng = np.random.default_rng(seed)
+
+    def generate(self, n: int) -> np.ndarray:
+        return self.rng.random(n)
+
+    def next(self) -> float:
+        if self.pos >= len(self.data):
+            self.data = self.generate(self.block).tolist()
+            self.pos = 0
+        value = self.data[self.pos]
+        self.pos += 1
+        return value
+
+    def take(self, n: int) -> np.ndarray:
+        # The next n samples as an array, for batch use
+        head = np.asarray(self.data[self.pos:], dtype=float)[:n]
+        self.pos += len(head)
+        if len(head) == n:
+            return head
+        return np.concatenate((head, self.generate(n - len(head))))
+
+
+def main() -> None:
+    a = PaeRandomSource(node_seed("rnd"), 8)
+    b = PaeRandomSource(node_seed("rnd"), 1024)
+    x = [a.next() for _ in range(20)]
+    y = b.take(20).tolist()
+    print(x == y, x[:3])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+#
+# HTTP/JSON endpoint for Pae
+#
+# File:     paehttp.py
+# Author:   Peter Malmberg  <peter.malmberg@gmail.com>
+# Org:      __ORGANISTATION__
+# Date:     2026-10-19
+# License:  MIT
+# Python:   >= 3.8
+#
+# ----------------------------------------------------------------------------
+#
+# Routes:
+#
+#   GET /values?prefix=<id prefix>
+#       All node values and flags.
+#   GET /changes?since=<tick>&prefix=<id prefix>&timeout=<s>
+#       Long poll, answers as soon as there is a tick newer than "since" with
+#       the nodes that changed after it.
+#   GET /stream?prefix=<id prefix>
+#       Server sent events, one event with the changed nodes per tick.
+#
+# The motor thread only captures a frame per tick, the motor snapshot and the
+# tick each node last changed. Response bodies are serialized lazily in the
+# server thread and cached until the next tick, so concurrent clients asking
+# the same thing share one serialization.
+#
+# The nodes in ids, or all nodes with an id, are served and observed.
+#
+
+from __future__ import annotations
+import asyncio
+import json
+import time
+import logging
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+
+from pae import PaeDriver
+from paepubsub import PaeLoopThread
+
+STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+# Longest wait of a /changes request, seconds
+MAX_TIMEOUT = 300.0
+
+
+class PaeHttpServer(PaeDriver):
+    def __init__(self, host: str = "127.0.0.1", port: int = 8080, ids: list = None) -> None:
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.ids = ids
+        self.frame = (0, 0.0, None, None)
+        self.last = np.empty(0)
+        self.last_vectors = {}
+        self.changed = np.empty(0, dtype=np.int64)
+        self.served = np.empty(0, dtype=bool)
+        self.cache = {}
+        self.cache_tick = 0
+        self.serializations = 0
+        self.routes = {
+            "/values": self.get_values,
+            "/changes": self.get_changes,
+        }
+        self.runner = None
+        self.server = None
+        self.new_tick = None
+
+    def add_route(self, path: str, handler) -> None:
+        # handler(query: dict) -> (content type, body bytes), called in the
+        # server thread
+        self.routes[path] = handler
+
+    def start(self) -> PaeHttpServer:
+        self.runner = PaeLoopThread("pae-http")
+        self.runner.run(self.serve()).result()
+        return self
+
+    async def serve(self) -> None:
+        self.new_tick = asyncio.Condition()
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        logging.debug(f"Http server listening on {self.host}:{self.port}")
+
+    def output(self) -> None:
+        snap = self.motor.snapshot()
+        tick = snap.tick
+        values = snap.values
+        if len(self.last) != len(values):
+            self.prepare()
+            self.last = np.full(len(values), np.nan)
+            # Nodes not served never change
+            self.changed = np.where(self.served, tick, -1)
+
+        changed = values != self.last
+        for i, value in snap.vectors.items():
+            last = self.last_vectors.get(i)
+            changed[i] = last is None or not np.array_equal(value, last)
+        self.last = values
+        self.last_vectors = snap.vectors
+        # A new array, the server thread may still use the old one
+        self.changed = np.where(changed & self.served, tick, self.changed)
+
+        self.frame = (tick, snap.time, snap, self.changed)
+        if self.runner is not None:
+            self.runner.run(self.notify())
+
+    def prepare(self) -> None:
+        self.served = np.zeros(len(self.motor.nodes), dtype=bool)
+        for node in self.select_nodes(self.ids):
+            self.served[node.index] = True
+
+    async def notify(self) -> None:
+        async with self.new_tick:
+            self.new_tick.notify_all()
+
+    def cached(self, key: tuple, build) -> bytes:
+        tick = self.frame[0]
+        if self.cache_tick != tick:
+            self.cache = {}
+            self.cache_tick = tick
+        body = self.cache.get(key)
+        if body is None:
+            body = json.dumps(build(self.frame), separators=(",", ":")).encode()
+            self.cache[key] = body
+            self.serializations += 1
+        return body
+
+    def values(self, frame: tuple, prefix: str, since: int = -1) -> dict:
+        tick, timestamp, snap, changed = frame
+        values = {}
+        flags = {}
+        if snap is not None:
+            ids = snap.ids
+            all_values = snap.values.tolist()
+            all_flags = snap.flags.tolist()
+            for i in np.flatnonzero(changed > since).tolist():
+                id = ids[i]
+                if id.startswith(prefix):
+                    vector = snap.vectors.get(i)
+                    values[id] = all_values[i] if vector is None else vector.tolist()
+                    flags[id] = all_flags[i]
+        return {"tick": tick, "time": timestamp, "values": values, "flags": flags}
+
+    def get_values(self, query: dict) -> tuple:
+        prefix = query.get("prefix", "")
+        body = self.cached(("values", prefix), lambda frame: self.values(frame, prefix))
+        return "application/json", body
+
+    def get_changes(self, query: dict) -> tuple:
+        prefix = query.get("prefix", "")
+        since = int(query.get("since", -1))
+        body = self.cached(("changes", prefix, since), lambda frame: self.values(frame, prefix, since))
+        return "application/json", body
+
+    async def wait_tick(self, since: int, timeout: float) -> None:
+        async with self.new_tick:
+            await asyncio.wait_for(
+                self.new_tick.wait_for(lambda: self.frame[0] > since), timeout
+            )
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request = await reader.readline()
+                if not request:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+
+                parts = request.decode("latin-1").split()
+                if len(parts) < 2:
+                    await self.respond(writer, 400, "text/plain", b"Bad request\n")
+                    break
+                method, target = parts[0], parts[1]
+                url = urlsplit(target)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+                if method != "GET":
+                    await self.respond(writer, 405, "text/plain", b"Only GET is supported\n")
+                elif url.path == "/stream":
+                    await self.stream(writer, query)
+                    break
+                elif url.path == "/changes":
+                    try:
+                        since = int(query.get("since", -1))
+                        timeout = float(query.get("timeout", 30))
+                        if not 0 <= timeout <= MAX_TIMEOUT:
+                            raise ValueError(f"timeout not in 0 to {MAX_TIMEOUT} s")
+                    except ValueError as e:
+                        await self.respond(writer, 400, "text/plain", f"Bad request: {e}\n".encode())
+                    else:
+                        try:
+                            await self.wait_tick(since, timeout)
+                        except asyncio.TimeoutError:
+                            pass
+                        await self.respond(writer, 200, *self.get_changes(query))
+                elif url.path in self.routes:
+                    try:
+                        response = self.routes[url.path](query)
+                    except ValueError as e:
+                        await self.respond(writer, 400, "text/plain", f"Bad request: {e}\n".encode())
+                    else:
+                        await self.respond(writer, 200, *response)
+                else:
+                    await self.respond(writer, 404, "text/plain", b"Not found\n")
+
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (OSError, ValueError) as e:
+            logging.debug(f"Http client dropped: {e}")
+        except asyncio.CancelledError:
+            # Server shutting down
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer: asyncio.StreamWriter, status: int, content_type: str, body: bytes) -> None:
+        writer.write(
+            f"HTTP/1.1 {status} {STATUS[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Cache-Control: no-cache\r\n"
+            "\r\n".encode("latin-1")
+            + body
+        )
+        await writer.drain()
+
+    async def stream(self, writer: asyncio.StreamWriter, query: dict) -> None:
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Connection: close\r\n"
+            b"\r\n"
+        )
+        since = -1
+        while True:
+            query["since"] = since
+            _, body = self.get_changes(query)
+            writer.write(b"data: " + body + b"\n\n")
+            await writer.drain()
+            since = self.cache_tick
+            await self.wait_tick(since, None)
+
+    def close(self) -> None:
+        self.release_nodes()
+        if self.runner is None:
+            return
+        self.server.close()
+        self.runner.stop()
+        self.runner = None
+
+
+def main() -> None:
+    from pae import PaeMotor, PaeNode, PaeType
+
+    motor = PaeMotor()
+    motor.add_node(PaeNode(type=PaeType.Sine, id="sin"))
+    motor.add_node(PaeNode(type=PaeType.Square, id="sqr", period=2.0))
+    motor.add_node(PaeNode(type=PaeType.Max, id="sin_max", source="sin"))
+    motor.initiate()
+    server = motor.add_driver(PaeHttpServer()).start()
+    print(f"Serving on http://{server.host}:{server.port}/values")
+
+    try:
+        while True:
+            motor.update()
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        motor.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+#
+# OpenMetrics exposition for Pae
+#
+# File:     paemetrics.py
+# Author:   Peter Malmberg  <peter.malmberg@gmail.com>
+# Org:      __ORGANISTATION__
+# Date:     2026-10-19
+# License:  MIT
+# Python:   >= 3.8
+#
+# ----------------------------------------------------------------------------
+#
+# Exposes node values and flags together with the motor performance counters
+# (tick duration histogram, overruns, evaluations per PaeType and driver input
+# latencies) in OpenMetrics text format.
+#
+# The series names and labels of every node are encoded once into a parts
+# list that is reused by every scrape; a scrape only formats the numbers into
+# the value slots and joins. The motor thread copies values into one of two
+# preallocated arrays and swaps them when no scrape is running, so neither
+# side waits for the other.
+#
+# The nodes in ids, or all nodes with an id, are exposed and observed.
+#
+
+from __future__ import annotations
+from array import array
+import math
+import threading
+
+import numpy as np
+
+from pae import PaeDriver, PaeHistogram
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def number(value: float) -> bytes:
+    # OpenMetrics spells the special values NaN, +Inf and -Inf
+    if math.isfinite(value):
+        return b"%r\n" % value
+    if math.isnan(value):
+        return b"NaN\n"
+    return b"+Inf\n" if value > 0 else b"-Inf\n"
+
+
+def histogram_lines(name: str, histogram: PaeHistogram, labels: str = "") -> list:
+    lines = []
+    cumulative = 0
+    sep = "," if labels else ""
+    for le, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels}{sep}le="{le}"}} {cumulative}')
+    labels = f"{{{labels}}}" if labels else ""
+    lines.append(f"{name}_sum{labels} {histogram.sum}")
+    lines.append(f"{name}_count{labels} {histogram.count}")
+    return lines
+
+
+class PaeMetrics(PaeDriver):
+    def __init__(self, prefix: str = "pae", period: float = 0.1, ids: list = None) -> None:
+        super().__init__()
+        self.prefix = prefix
+        self.period = period
+        self.ids = ids
+        self.index = None
+        self.known = 0
+        self.parts = []
+        self.front = array("d")
+        self.back = array("d")
+        self.front_flags = array("H")
+        self.back_flags = array("H")
+        self.lock = threading.Lock()
+
+    def attach(self, motor) -> None:
+        super().attach(motor)
+        motor.enable_stats(self.period)
+
+    def prepare(self) -> None:
+        # One gauge per node, vector nodes are left out
+        self.select_nodes(self.ids, vectors=False)
+        self.index = np.array([node.index for node in self.nodes], dtype=np.intp)
+        self.known = len(self.motor.nodes)
+        count = len(self.nodes)
+        self.front = array("d", bytes(8 * count))
+        self.back = array("d", bytes(8 * count))
+        self.front_flags = array("H", bytes(2 * count))
+        self.back_flags = array("H", bytes(2 * count))
+
+        p = self.prefix
+        parts = [f"# TYPE {p}_node_value gauge\n".encode()]
+        for node in self.nodes:
+            labels = f'id="{escape(node.id)}",name="{escape(node.get_name())}",type="{node.type.name}"'
+            parts.append(f"{p}_node_value{{{labels}}} ".encode())
+            parts.append(b"")
+        parts.append(f"# TYPE {p}_node_flags gauge\n".encode())
+        for node in self.nodes:
+            parts.append(f'{p}_node_flags{{id="{escape(node.id)}"}} '.encode())
+            parts.append(b"")
+        self.parts = parts
+
+    def output(self) -> None:
+        if self.known != len(self.motor.nodes):
+            with self.lock:
+                self.prepare()
+
+        snap = self.motor.snapshot()
+        np.frombuffer(self.back, dtype=np.float64)[:] = snap.values[self.index]
+        np.frombuffer(self.back_flags, dtype=np.uint16)[:] = snap.flags[self.index]
+
+        # Never wait for a scrape, the values are swapped in on a later tick
+        if self.lock.acquire(blocking=False):
+            self.front, self.back = self.back, self.front
+            self.front_flags, self.back_flags = self.back_flags, self.front_flags
+            self.lock.release()
+
+    def render_engine(self) -> bytes:
+        p = self.prefix
+        stats = self.motor.stats
+        lines = [f"# TYPE {p}_tick_duration_seconds histogram"]
+        lines += histogram_lines(f"{p}_tick_duration_seconds", stats.tick_duration)
+        lines.append(f"# TYPE {p}_tick_overruns counter")
+        lines.append(f"{p}_tick_overruns_total {stats.overruns}")
+        lines.append(f"# TYPE {p}_evaluations counter")
+        for type, count in list(stats.evaluations.items()):
+            lines.append(f'{p}_evaluations_total{{type="{type.name}"}} {count}')
+        lines.append(f"# TYPE {p}_input_duration_seconds histogram")
+        for driver, histogram in list(stats.input_duration.items()):
+            lines += histogram_lines(f"{p}_input_duration_seconds", histogram, f'driver="{driver}"')
+        lines.append("")
+        return "\n".join(lines).encode()
+
+    def render(self) -> bytes:
+        with self.lock:
+            parts = self.parts
+            values = self.front
+            flags = self.front_flags
+            count = len(values)
+            for i in range(count):
+                parts[2 + 2 * i] = number(values[i])
+                parts[3 + 2 * count + 2 * i] = b"%d\n" % flags[i]
+            nodes = b"".join(parts)
+        return self.render_engine() + nodes + b"# EOF\n"
+
+    def close(self) -> None:
+        self.release_nodes()
+        self.known = 0
+
+    def get_metrics(self, query: dict) -> tuple:
+        return CONTENT_TYPE, self.render()
+
+    def serve(self, http) -> None:
+        http.add_route("/metrics", self.get_metrics)
+
+
+def main() -> None:
+    from pae import PaeMotor, PaeNode, PaeType
+
+    motor = PaeMotor()
+    motor.add_node(PaeNode(type=PaeType.Sine, id="sin", name="Sine"))
+    motor.add_node(PaeNode(type=PaeType.Max, id="max", name="Max", source="sin"))
+    motor.initiate()
+    metrics = motor.add_driver(PaeMetrics())
+    for _ in range(10):
+        motor.update()
+    print(metrics.render().decode())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+#
+# Modbus-TCP client driver for Pae
+#
+# File:     paemodbus.py
+# Author:   Peter Malmberg  <peter.malmberg@gmail.com>
+# Org:      __ORGANISTATION__
+# Date:     2026-10-19
+# License:  MIT
+# Python:   >= 3.8
+#
+# ----------------------------------------------------------------------------
+#
+# Nodes of type ModbusInput/ModbusOutput name a device and a holding register
+# address. Every tick the driver collects all input registers of a device,
+# coalesces them into as few read holding register requests as possible and
+# sends the requests to all devices before waiting for any answer. Connections
+# are persistent and shared between drivers through a pool.
+#
+# A connection that fails is not retried before a backoff delay, doubled on
+# every failure up to max_backoff. Meanwhile its devices are skipped and
+# their inputs are NoData, so a device that is down does not stall the ticks.
+#
+
+from __future__ import annotations
+import math
+import socket
+import socketserver
+import struct
+import threading
+import time
+import logging
+
+from pae import PaeDriver, PaeNode, PaeType
+
+READ_HOLDING_REGISTERS = 0x03
+WRITE_SINGLE_REGISTER = 0x06
+WRITE_MULTIPLE_REGISTERS = 0x10
+
+MAX_READ_REGISTERS = 125
+MAX_WRITE_REGISTERS = 123
+
+MBAP = struct.Struct(">HHHB")
+
+
+class PaeModbusError(Exception):
+    pass
+
+
+def coalesce(addresses, max_gap: int = 8, max_count: int = MAX_READ_REGISTERS) -> list:
+    # Group register addresses into (start, count) blocks. Gaps up to max_gap
+    # registers are read along instead of starting a new request.
+    blocks = []
+    start = None
+    end = None
+    for address in sorted(set(addresses)):
+        if start is not None and address - end <= max_gap + 1 and address - start < max_count:
+            end = address
+            continue
+        if start is not None:
+            blocks.append((start, end - start + 1))
+        start = end = address
+    if start is not None:
+        blocks.append((start, end - start + 1))
+    return blocks
+
+
+def recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed by peer")
+        data += chunk
+    return data
+
+
+class PaeModbusConnection:
+    def __init__(
+        self,
+        host: str,
+        port: int = 502,
+        timeout: float = 1.0,
+        backoff: float = 1.0,
+        max_backoff: float = 30.0,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.delay = 0.0
+        self.retry = 0.0
+        self.sock = None
+        self.tid = 0
+        self.lock = threading.Lock()
+
+    def connect(self) -> None:
+        if self.sock is not None:
+            return
+        if self.waiting():
+            raise PaeModbusError(f"Waiting to reconnect to {self.host}:{self.port}")
+        try:
+            self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        except OSError:
+            self.failed()
+            raise
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.delay = 0.0
+        logging.debug(f"Modbus connected to {self.host}:{self.port}")
+
+    def waiting(self) -> bool:
+        return self.sock is None and time.monotonic() < self.retry
+
+    def failed(self) -> None:
+        # Closed, and not connected again before the backoff delay
+        self.close()
+        self.delay = min(self.max_backoff, 2 * self.delay if self.delay else self.backoff)
+        self.retry = time.monotonic() + self.delay
+
+    def close(self) -> None:
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def send(self, unit: int, pdu: bytes) -> int:
+        self.connect()
+        self.tid = (self.tid + 1) & 0xFFFF
+        self.sock.sendall(MBAP.pack(self.tid, 0, len(pdu) + 1, unit) + pdu)
+        return self.tid
+
+    def send_read(self, unit: int, start: int, count: int) -> int:
+        return self.send(unit, struct.pack(">BHH", READ_HOLDING_REGISTERS, start, count))
+
+    def send_write(self, unit: int, start: int, values: list) -> int:
+        if len(values) == 1:
+            pdu = struct.pack(">BHH", WRITE_SINGLE_REGISTER, start, values[0])
+        else:
+            pdu = struct.pack(
+                f">BHHB{len(values)}H",
+                WRITE_MULTIPLE_REGISTERS,
+                start,
+                len(values),
+                len(values) * 2,
+                *values,
+            )
+        return self.send(unit, pdu)
+
+    def receive(self) -> tuple:
+        if self.sock is None:
+            # Closed by a failure of another device on the connection
+            raise PaeModbusError(f"Connection to {self.host}:{self.port} lost")
+        tid, _, length, _ = MBAP.unpack(recv_exact(self.sock, MBAP.size))
+        pdu = recv_exact(self.sock, length - 1)
+        function = pdu[0]
+        if function & 0x80:
+            raise PaeModbusError(f"Modbus exception {pdu[1]} for function {function & 0x7F}")
+        if function == READ_HOLDING_REGISTERS:
+            count = pdu[1] // 2
+            return tid, list(struct.unpack(f">{count}H", pdu[2: 2 + pdu[1]]))
+        return tid, None
+
+
+class PaeModbusPool:
+    def __init__(self) -> None:
+        self.connections = {}
+        self.lock = threading.Lock()
+
+    def get(self, host: str, port: int = 502) -> PaeModbusConnection:
+        with self.lock:
+            key = (host, port)
+            if key not in self.connections:
+                self.connections[key] = PaeModbusConnection(host, port)
+            return self.connections[key]
+
+    def close(self) -> None:
+        with self.lock:
+            for conn in self.connections.values():
+                conn.close()
+            self.connections.clear()
+
+
+default_pool = PaeModbusPool()
+
+
+class PaeModbusDevice:
+    def __init__(self, id: str, connection: PaeModbusConnection, unit: int = 1) -> None:
+        self.id = id
+        self.connection = connection
+        self.unit = unit
+        self.inputs = []
+        self.outputs = []
+        self.blocks = []
+        self.written = {}
+
+    def plan(self, max_gap: int) -> None:
+        self.blocks = coalesce([node.address for node in self.inputs], max_gap)
+
+
+class PaeModbus(PaeDriver):
+    def __init__(self, pool: PaeModbusPool = None, max_gap: int = 8) -> None:
+        super().__init__()
+        self.pool = pool if pool is not None else default_pool
+        self.max_gap = max_gap
+        self.devices = {}
+        self.planned = False
+
+    def add_device(self, id: str, host: str, port: int = 502, unit: int = 1) -> PaeModbusDevice:
+        device = PaeModbusDevice(id, self.pool.get(host, port), unit)
+        self.devices[id] = device
+        self.planned = False
+        return device
+
+    def plan(self) -> None:
+        for device in self.devices.values():
+            device.inputs.clear()
+            device.outputs.clear()
+
+        for node in self.motor.nodes:
+            if node.type not in (PaeType.ModbusInput, PaeType.ModbusOutput):
+                continue
+            device = self.devices.get(node.device)
+            if device is None:
+                logging.warning(f"Node {node.id} refers to unknown Modbus device {node.device}")
+                continue
+            if node.type == PaeType.ModbusInput:
+                device.inputs.append(node)
+            else:
+                device.outputs.append(node)
+
+        for device in self.devices.values():
+            device.plan(self.max_gap)
+        self.planned = True
+
+    def fail(self, device: PaeModbusDevice, nodes: list, e: Exception) -> None:
+        logging.warning(f"Modbus device {device.id}: {e}")
+        if not device.connection.waiting():
+            device.connection.failed()
+        for node in nodes:
+            node.no_data = True
+
+    def input(self) -> None:
+        if not self.planned:
+            self.plan()
+
+        # Send every request before reading any answer so that the round
+        # trips to different devices overlap.
+        pending = []
+        for device in self.devices.values():
+            if not device.blocks:
+                continue
+            if device.connection.waiting():
+                for node in device.inputs:
+                    node.no_data = True
+                continue
+            try:
+                with device.connection.lock:
+                    tids = [
+                        device.connection.send_read(device.unit, start, count)
+                        for start, count in device.blocks
+                    ]
+                pending.append((device, tids))
+            except (OSError, PaeModbusError) as e:
+                self.fail(device, device.inputs, e)
+
+        for device, tids in pending:
+            registers = {}
+            try:
+                with device.connection.lock:
+                    for (start, count), tid in zip(device.blocks, tids):
+                        rtid, values = device.connection.receive()
+                        if rtid != tid:
+                            raise PaeModbusError(f"Unexpected transaction {rtid}, expected {tid}")
+                        registers.update(zip(range(start, start + count), values))
+            except (OSError, PaeModbusError) as e:
+                self.fail(device, device.inputs, e)
+                continue
+
+            for node in device.inputs:
+                node.no_data = False
+                node.set_value(registers[node.address] * node.get(node.factor) + node.get(node.offset))
+
+    def output(self) -> None:
+        for device in self.devices.values():
+            changed = {}
+            for node in device.outputs:
+                if not node.is_enabled():
+                    continue
+                scaled = (node.value - node.get(node.offset)) / node.get(node.factor)
+                if not math.isfinite(scaled):
+                    # NaN and infinity have no register value, nothing is written
+                    continue
+                raw = int(round(scaled)) & 0xFFFF
+                if device.written.get(node.address) != raw:
+                    changed[node.address] = raw
+            if not changed or device.connection.waiting():
+                continue
+
+            try:
+                with device.connection.lock:
+                    tids = []
+                    for start, count in coalesce(changed, 0, MAX_WRITE_REGISTERS):
+                        values = [changed[a] for a in range(start, start + count)]
+                        tids.append(device.connection.send_write(device.unit, start, values))
+                    for tid in tids:
+                        device.connection.receive()
+                device.written.update(changed)
+            except (OSError, PaeModbusError) as e:
+                self.fail(device, device.outputs, e)
+
+    def close(self) -> None:
+        for device in self.devices.values():
+            device.connection.close()
+
+
+class PaeModbusHandler(socketserver.BaseRequestHandler):
+    def handle(self) -> None:
+        registers = self.server.registers
+        while True:
+            try:
+                tid, pid, length, unit = MBAP.unpack(recv_exact(self.request, MBAP.size))
+                pdu = recv_exact(self.request, length - 1)
+            except (ConnectionError, OSError):
+                return
+
+            function = pdu[0]
+            self.server.requests += 1
+            if function == READ_HOLDING_REGISTERS:
+                start, count = struct.unpack(">HH", pdu[1:5])
+                values = registers[start: start + count]
+                reply = struct.pack(f">BB{count}H", function, count * 2, *values)
+            elif function == WRITE_SINGLE_REGISTER:
+                address, value = struct.unpack(">HH", pdu[1:5])
+                registers[address] = value
+                reply = pdu[:5]
+            elif function == WRITE_MULTIPLE_REGISTERS:
+                start, count = struct.unpack(">HH", pdu[1:5])
+                registers[start: start + count] = struct.unpack(f">{count}H", pdu[6: 6 + count * 2])
+                reply = pdu[:5]
+            else:
+                reply = struct.pack(">BB", function | 0x80, 1)
+
+            self.request.sendall(MBAP.pack(tid, pid, len(reply) + 1, unit) + reply)
+
+
+class PaeModbusServer(socketserver.ThreadingTCPServer):
+    # Minimal in-process Modbus-TCP server with 65536 holding registers,
+    # intended as a stand-in for real devices when testing.
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        super().__init__((host, port), PaeModbusHandler)
+        self.registers = [0] * 65536
+        self.requests = 0
+        self.thread = None
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> PaeModbusServer:
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def main() -> None:
+    from pae import PaeMotor
+
+    server = PaeModbusServer().start()
+    for i in range(16):
+        server.registers[100 + i] = i * 10
+
+    motor = PaeMotor()
+    modbus = motor.add_driver(PaeModbus())
+    modbus.add_device("plc", "127.0.0.1", server.port)
+    for i in range(0, 16, 3):
+        motor.add_node(PaeNode(type=PaeType.ModbusInput, id=f"in{i}", device="plc", address=100 + i))
+    motor.add_node(PaeNode(type=PaeType.ModbusOutput, id="out", source="in3", device="plc", address=200))
+    motor.initiate()
+
+    motor.update()
+    motor.update()
+    print(motor)
+    print(f"Server requests: {server.requests}, register 200: {server.registers[200]}")
+
+    motor.close()
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -14,7 +14,7 @@
 # ----------------------------------------------------------------------------
 
 import pyqtgraph as pg
-from pae import PaeNode
+from pae import PaeNode, PaeSnapshot
 
 pen = pg.mkPen(color="#ff00ff", width=1)
 
@@ -36,10 +36,13 @@ class PaePlot(pg.PlotWidget):
         self.y = [0 for _ in range(self.datapoints)]
         self.line = self.plot(self.x, self.y, pen=pen)
 
-    def update(self):
+        if node.motor is not None:
+            node.motor.observe(node)
+
+    def update(self, snap: PaeSnapshot = None):
         self.tick += 1
         if self.tick >= self.intervall:
-            self.update_plot(self.node.value)
+            self.update_plot(self.node.value if snap is None else snap.get(self.node)[0])
             self.tick = 0
 
     def update_plot(self, new_val):
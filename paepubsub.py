@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+#
+# Publish/subscribe bridge for Pae
+#
+# File:     paepubsub.py
+# Author:   Peter Malmberg  <peter.malmberg@gmail.com>
+# Org:      __ORGANISTATION__
+# Date:     2026-10-19
+# License:  MIT
+# Python:   >= 3.8
+#
+# ----------------------------------------------------------------------------
+#
+# MQTT style topic bridge. Node values are published on "<prefix>/<node id>"
+# and values received on "<prefix>/<node id>/set" are written to the node.
+# Topic filters support the MQTT wildcards "+" and "#".
+#
+# The wire format is one JSON object per line:
+#
+#   {"op": "sub", "topic": "pae/+/set"}
+#   {"op": "pub", "items": [["pae/sin", 0.84], ["pae/sqr", 1]]}
+#
+# All changes seen since the last send are coalesced into one "pub" frame,
+# later values replacing earlier ones. While the transport is busy draining,
+# changes keep coalescing instead of queueing up.
+#
+# The nodes in ids, or all nodes with an id, are published and observed.
+#
+
+from __future__ import annotations
+import asyncio
+import json
+import threading
+import logging
+
+from pae import PaeDriver
+
+
+def topic_match(filter: str, topic: str) -> bool:
+    fparts = filter.split("/")
+    tparts = topic.split("/")
+    for i, part in enumerate(fparts):
+        if part == "#":
+            return True
+        if i >= len(tparts):
+            return False
+        if part != "+" and part != tparts[i]:
+            return False
+    return len(fparts) == len(tparts)
+
+
+def encode(op: str, **kwargs) -> bytes:
+    return json.dumps({"op": op, **kwargs}, separators=(",", ":")).encode() + b"\n"
+
+
+class PaeLoopThread:
+    # Runs an asyncio event loop in a daemon thread
+
+    def __init__(self, name: str) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self.thread.start()
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def shutdown(self) -> None:
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop(self) -> None:
+        self.run(self.shutdown()).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+class PaeBridge(PaeDriver):
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 1883,
+        prefix: str = "pae",
+        reconnect: float = 1.0,
+        ids: list = None,
+    ) -> None:
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.prefix = prefix
+        self.reconnect = reconnect
+        self.ids = ids
+        self.known = 0
+        self.published = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.connected = threading.Event()
+        self.runner = None
+        self.wakeup = None
+        self.sent_frames = 0
+
+    def topic(self, node) -> str:
+        return f"{self.prefix}/{node.id}"
+
+    def start(self) -> PaeBridge:
+        self.runner = PaeLoopThread("pae-bridge")
+        self.runner.run(self.run())
+        return self
+
+    def prepare(self) -> None:
+        self.select_nodes(self.ids)
+        self.known = len(self.motor.nodes)
+
+    def output(self) -> None:
+        if self.known != len(self.motor.nodes):
+            self.prepare()
+
+        # published is only written here, and read by run() under the lock
+        changed = []
+        for node in self.nodes:
+            value = node.value
+            if node.channels:
+                value = value.tolist()
+            if self.published.get(node.id) != value:
+                changed.append((node, value))
+
+        if not changed:
+            return
+
+        with self.lock:
+            for node, value in changed:
+                self.published[node.id] = value
+                self.pending[self.topic(node)] = value
+
+        if self.wakeup is not None:
+            self.runner.loop.call_soon_threadsafe(self.wakeup.set)
+
+    async def run(self) -> None:
+        self.wakeup = asyncio.Event()
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+            except OSError as e:
+                logging.warning(f"Bridge could not connect to {self.host}:{self.port}: {e}")
+                await asyncio.sleep(self.reconnect)
+                continue
+
+            writer.write(encode("sub", topic=f"{self.prefix}/+/set"))
+            # Everything is republished after a (re)connect
+            with self.lock:
+                self.pending.update(
+                    {f"{self.prefix}/{id}": value for id, value in self.published.items()}
+                )
+            self.wakeup.set()
+            self.connected.set()
+
+            sender = asyncio.ensure_future(self.send(writer))
+            try:
+                await self.receive(reader)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Bridge connection lost: {e}")
+            finally:
+                self.connected.clear()
+                sender.cancel()
+                writer.close()
+            await asyncio.sleep(self.reconnect)
+
+    async def send(self, writer: asyncio.StreamWriter) -> None:
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            with self.lock:
+                items, self.pending = self.pending, {}
+            if not items:
+                continue
+            writer.write(encode("pub", items=list(items.items())))
+            self.sent_frames += 1
+            await writer.drain()
+
+    async def receive(self, reader: asyncio.StreamReader) -> None:
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("Broker closed the connection")
+            frame = json.loads(line)
+            if frame.get("op") != "pub":
+                continue
+            for topic, payload in frame["items"]:
+                self.received(topic, payload)
+
+    def received(self, topic: str, payload) -> None:
+        parts = topic.split("/")
+        if len(parts) != 3 or parts[0] != self.prefix or parts[2] != "set":
+            return
+        node = self.motor.find_node(parts[1])
+        if node is None:
+            logging.warning(f"Bridge received value for unknown node {parts[1]}")
+            return
+        try:
+            self.motor.post_set_value(node, float(payload))
+        except (TypeError, ValueError):
+            logging.warning(f"Bridge received invalid value {payload!r} on {topic}")
+
+    def close(self) -> None:
+        self.release_nodes()
+        self.known = 0
+        if self.runner is None:
+            return
+        self.runner.stop()
+        self.runner = None
+
+
+class PaeBrokerClient:
+    def __init__(self, writer: asyncio.StreamWriter, queue_size: int) -> None:
+        self.writer = writer
+        self.filters = []
+        self.queue = asyncio.Queue(queue_size)
+
+    async def send(self) -> None:
+        while True:
+            frame = await self.queue.get()
+            self.writer.write(frame)
+            await self.writer.drain()
+
+
+class PaeBroker:
+    # Lightweight local broker stand-in, enough to test bridges offline.
+    # Each client has a bounded outgoing queue; a slow subscriber makes the
+    # broker stop reading from publishers until the queue has room.
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, queue_size: int = 64) -> None:
+        self.host = host
+        self.port = port
+        self.queue_size = queue_size
+        self.clients = []
+        self.server = None
+        self.runner = None
+
+    def start(self) -> PaeBroker:
+        self.runner = PaeLoopThread("pae-broker")
+        self.runner.run(self.serve()).result()
+        return self
+
+    async def serve(self) -> None:
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        client = PaeBrokerClient(writer, self.queue_size)
+        self.clients.append(client)
+        sender = asyncio.ensure_future(client.send())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                frame = json.loads(line)
+                if frame.get("op") == "sub":
+                    client.filters.append(frame["topic"])
+                elif frame.get("op") == "pub":
+                    await self.publish(frame["items"])
+        except (OSError, ValueError) as e:
+            logging.debug(f"Broker client dropped: {e}")
+        finally:
+            self.clients.remove(client)
+            sender.cancel()
+            writer.close()
+
+    async def publish(self, items: list) -> None:
+        for client in list(self.clients):
+            matched = [
+                item for item in items if any(topic_match(f, item[0]) for f in client.filters)
+            ]
+            if matched:
+                await client.queue.put(encode("pub", items=matched))
+
+    def stop(self) -> None:
+        if self.runner is None:
+            return
+        self.server.close()
+        self.runner.stop()
+        self.runner = None
+
+
+async def subscribe(host: str, port: int, topic: str, count: int) -> list:
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(encode("sub", topic=topic))
+    writer.write(encode("pub", items=[["pae/input/set", 42]]))
+    frames = []
+    for _ in range(count):
+        frames.append(json.loads(await reader.readline()))
+    writer.close()
+    return frames
+
+
+def main() -> None:
+    import time
+    from pae import PaeMotor, PaeNode, PaeType
+
+    broker = PaeBroker().start()
+
+    motor = PaeMotor()
+    motor.add_node(PaeNode(type=PaeType.Sine, id="sin"))
+    motor.add_node(PaeNode(type=PaeType.Normal, id="input"))
+    motor.initiate()
+    bridge = motor.add_driver(PaeBridge(port=broker.port)).start()
+    bridge.connected.wait(2)
+
+    listener = PaeLoopThread("listener")
+    frames = listener.run(subscribe("127.0.0.1", broker.port, "pae/#", 5))
+    for _ in range(10):
+        motor.update()
+        time.sleep(0.05)
+
+    for frame in frames.result(2):
+        print(frame)
+    print(f"input = {motor.find_node('input').value}, frames sent: {bridge.sent_frames}")
+
+    listener.stop()
+    motor.close()
+    broker.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+#
+# Columnar value recorder for Pae
+#
+# File:     paerecorder.py
+# Author:   Peter Malmberg  <peter.malmberg@gmail.com>
+# Org:      __ORGANISTATION__
+# Date:     2026-10-19
+# License:  MIT
+# Python:   >= 3.8
+#
+# ----------------------------------------------------------------------------
+#
+# File layout (little endian):
+#
+#   header
+#     magic        8s    b"PAEREC1\0"
+#     version      u32
+#     columns      u32   number of recorded nodes
+#     block_rows   u32   rows per block
+#     header_size  u32   bytes up to the first block, multiple of 8
+#     ids          JSON list of node ids, nul padded
+#   block, repeated
+#     rows         u32   used rows, block_rows for all but the last block
+#     reserved     u32
+#     time         f64[block_rows]   wall clock
+#     now          f64[block_rows]   motor time of the tick, see update()
+#     column       f64[block_rows], one per node
+#
+# All blocks have the same size, so a reader can memory map the file and
+# address any column of any block directly.
+#
+
+from __future__ import annotations
+import json
+import mmap
+import queue
+import struct
+import threading
+import time
+import logging
+
+import numpy as np
+
+from pae import PaeDriver
+
+MAGIC = b"PAEREC1\0"
+VERSION = 2
+HEADER = struct.Struct("<8sIIII")
+BLOCK_HEADER = struct.Struct("<II")
+
+
+def block_size(columns: int, block_rows: int) -> int:
+    return BLOCK_HEADER.size + 8 * block_rows * (columns + 2)
+
+
+class PaeRecorder(PaeDriver):
+    def __init__(self, path: str, ids: list = None, block_rows: int = 4096, buffers: int = 4) -> None:
+        super().__init__()
+        self.path = path
+        self.ids = ids
+        self.block_rows = block_rows
+        self.buffers = buffers
+        self.index = None
+        self.block = None
+        self.row = 0
+        self.free = queue.Queue()
+        self.full = queue.Queue()
+        self.thread = None
+        self.dropped = 0
+
+    def open(self) -> None:
+        self.select_nodes(self.ids, vectors=False)
+        ids = [node.id for node in self.nodes]
+        self.index = np.array([node.index for node in self.nodes], dtype=np.intp)
+
+        for _ in range(self.buffers):
+            self.free.put(np.zeros((len(ids) + 2, self.block_rows)))
+        self.block = self.free.get()
+        self.row = 0
+
+        meta = json.dumps(ids).encode()
+        header_size = (HEADER.size + len(meta) + 7) // 8 * 8
+        header = HEADER.pack(MAGIC, VERSION, len(ids), self.block_rows, header_size)
+        self.file = open(self.path, "wb")
+        self.file.write((header + meta).ljust(header_size, b"\0"))
+
+        self.thread = threading.Thread(target=self.writer, name="pae-recorder", daemon=True)
+        self.thread.start()
+
+    def output(self) -> None:
+        if self.thread is None:
+            self.open()
+
+        snap = self.motor.snapshot()
+        block = self.block
+        row = self.row
+        block[0, row] = snap.time
+        block[1, row] = snap.now
+        block[2:, row] = snap.values[self.index]
+        self.row = row + 1
+
+        if self.row == self.block_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        self.full.put((self.block, self.row))
+        try:
+            self.block = self.free.get_nowait()
+        except queue.Empty:
+            # Writer is behind, keep recording into a new buffer
+            self.block = np.zeros_like(self.block)
+            self.dropped += 1
+        self.row = 0
+
+    def writer(self) -> None:
+        while True:
+            item = self.full.get()
+            if item is None:
+                break
+            block, rows = item
+            self.file.write(BLOCK_HEADER.pack(rows, 0))
+            self.file.write(block.tobytes())
+            self.file.flush()
+            self.free.put(block)
+
+    def close(self) -> None:
+        if self.thread is None:
+            return
+        if self.row > 0:
+            self.flush()
+        self.full.put(None)
+        self.thread.join()
+        self.file.close()
+        self.thread = None
+        self.release_nodes()
+        if self.dropped:
+            logging.warning(f"Recorder needed {self.dropped} extra buffers, writer too slow")
+
+
+class PaeRecording:
+    def __init__(self, path: str) -> None:
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, columns, block_rows, header_size = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a pae recording")
+
+        self.columns = columns
+        self.block_rows = block_rows
+        self.header_size = header_size
+        self.ids = json.loads(bytes(self.mm[HEADER.size: header_size]).rstrip(b"\0"))
+        self.index = {id: i for i, id in enumerate(self.ids)}
+        self.block_size = block_size(columns, block_rows)
+        self.block_count = (len(self.mm) - header_size) // self.block_size
+
+    def block(self, i: int) -> np.ndarray:
+        # Rows of the returned array are time and now followed by one row
+        # per node
+        offset = self.header_size + i * self.block_size
+        rows, _ = BLOCK_HEADER.unpack_from(self.mm, offset)
+        data = np.frombuffer(
+            self.mm,
+            dtype="<f8",
+            count=(self.columns + 2) * self.block_rows,
+            offset=offset + BLOCK_HEADER.size,
+        )
+        return data.reshape(self.columns + 2, self.block_rows)[:, :rows]
+
+    def blocks(self):
+        for i in range(self.block_count):
+            yield self.block(i)
+
+    def __len__(self) -> int:
+        if self.block_count == 0:
+            return 0
+        return (self.block_count - 1) * self.block_rows + self.block(self.block_count - 1).shape[1]
+
+    def row(self, id: str) -> int:
+        return self.index[id] + 2
+
+    def time(self) -> np.ndarray:
+        return np.concatenate([block[0] for block in self.blocks()] or [np.empty(0)])
+
+    def now(self) -> np.ndarray:
+        return np.concatenate([block[1] for block in self.blocks()] or [np.empty(0)])
+
+    def column(self, id: str) -> np.ndarray:
+        row = self.row(id)
+        return np.concatenate([block[row] for block in self.blocks()] or [np.empty(0)])
+
+    def close(self) -> None:
+        self.mm.close()
+        self.file.close()
+
+
+def main() -> None:
+    import sys
+    from pae import PaeMotor, PaeNode, PaeType
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "pae.rec"
+
+    motor = PaeMotor()
+    motor.add_node(PaeNode(type=PaeType.Sine, id="sin"))
+    motor.add_node(PaeNode(type=PaeType.Random, id="rnd"))
+    motor.add_node(PaeNode(type=PaeType.Average, id="avg", source="rnd", average=10))
+    motor.initiate()
+    motor.add_driver(PaeRecorder(path, block_rows=256))
+    for _ in range(1000):
+        motor.update()
+    motor.close()
+
+    rec = PaeRecording(path)
+    print(f"{len(rec)} rows of {rec.ids} in {rec.block_count} blocks")
+    for id in rec.ids:
+        column = rec.column(id)
+        print(f"{id:10} min {column.min():8.3f} max {column.max():8.3f} mean {column.mean():8.3f}")
+    rec.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+#
+# Replay of recorded inputs for Pae
+#
+# File:     paereplay.py
+# Author:   Peter Malmberg  <peter.malmberg@gmail.com>
+# Org:      __ORGANISTATION__
+# Date:     2026-10-19
+# License:  MIT
+# Python:   >= 3.8
+#
+# ----------------------------------------------------------------------------
+#
+# Feeds the input columns of a recording (see paerecorder.py) into a motor one
+# row per tick and compares the other recorded columns against the values the
+# motor computes. The recording is read one block at a time, so only the block
+# being replayed has to be in memory.
+#
+
+from __future__ import annotations
+from dataclasses import dataclass, field
+import time
+import logging
+
+from pae import PaeMotor, PaeType
+from paerecorder import PaeRecording
+
+INPUT_TYPES = (PaeType.Normal, PaeType.ModbusInput)
+
+
+@dataclass
+class PaeReplayDiff:
+    tick: int
+    id: str
+    expected: float
+    actual: float
+
+
+@dataclass
+class PaeReplayReport:
+    ticks: int = 0
+    failed_ticks: int = 0
+    diff_count: dict = field(default_factory=dict)
+    max_diff: dict = field(default_factory=dict)
+    diffs: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+    def ok(self) -> bool:
+        return self.failed_ticks == 0
+
+    def __str__(self) -> str:
+        out = f"Replayed {self.ticks} ticks in {self.elapsed:.3f} s, {self.failed_ticks} ticks with differences\n"
+        for id, count in self.diff_count.items():
+            out += f"  {id:16} {count:8} diffs, max {self.max_diff[id]:.6g}\n"
+        return out
+
+
+class PaeReplay:
+    def __init__(
+        self,
+        motor: PaeMotor,
+        recording: PaeRecording,
+        inputs: list = None,
+        reference: list = None,
+        tolerance: float = 1e-9,
+        speed: float = None,
+        max_diffs: int = 1000,
+    ) -> None:
+        self.motor = motor
+        self.recording = recording
+        self.tolerance = tolerance
+        self.speed = speed
+        self.max_diffs = max_diffs
+
+        nodes = {id: motor.find_node(id) for id in recording.ids}
+        missing = [id for id, node in nodes.items() if node is None]
+        if missing:
+            logging.warning(f"Recorded nodes not in motor: {missing}")
+
+        if inputs is None:
+            inputs = [
+                id for id, node in nodes.items()
+                if node is not None and node.type in INPUT_TYPES and node.source is None
+            ]
+        if reference is None:
+            reference = [id for id, node in nodes.items() if node is not None and id not in inputs]
+
+        self.inputs = [(recording.row(id), nodes[id]) for id in inputs]
+        self.reference = [(recording.row(id), nodes[id]) for id in reference]
+
+    def run(self) -> PaeReplayReport:
+        report = PaeReplayReport()
+        report.diff_count = {node.id: 0 for _, node in self.reference}
+        report.max_diff = {node.id: 0.0 for _, node in self.reference}
+        tolerance = self.tolerance
+        start = time.perf_counter()
+        t0 = None
+        for _, node in self.reference:
+            self.motor.observe(node)
+
+        for block in self.recording.blocks():
+            times = block[1].tolist()
+            inputs = [(node, block[row].tolist()) for row, node in self.inputs]
+            reference = [(node, block[row].tolist()) for row, node in self.reference]
+
+            for j, t in enumerate(times):
+                if self.speed is not None:
+                    if t0 is None:
+                        t0 = t
+                    delay = start + (t - t0) / self.speed - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+
+                for node, values in inputs:
+                    node.set_value(values[j])
+
+                # At the recorded motor time, time dependent nodes give the
+                # same values at any replay speed
+                self.motor.update(t)
+
+                failed = False
+                for node, values in reference:
+                    diff = abs(node.value - values[j])
+                    if diff > tolerance or diff != diff:
+                        failed = True
+                        id = node.id
+                        report.diff_count[id] += 1
+                        if not diff <= report.max_diff[id]:
+                            report.max_diff[id] = diff
+                        if len(report.diffs) < self.max_diffs:
+                            report.diffs.append(PaeReplayDiff(report.ticks, id, values[j], node.value))
+                if failed:
+                    report.failed_ticks += 1
+                report.ticks += 1
+
+        for _, node in self.reference:
+            self.motor.unobserve(node)
+        report.elapsed = time.perf_counter() - start
+        return report
+
+
+def main() -> None:
+    import sys
+    from pae import PaeNode
+    from paerecorder import PaeRecorder
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "pae.rec"
+
+    def build(limit: float) -> PaeMotor:
+        motor = PaeMotor()
+        motor.add_node(PaeNode(type=PaeType.Normal, id="raw"))
+        motor.add_node(PaeNode(type=PaeType.Average, id="avg", source="raw", average=5))
+        motor.add_node(PaeNode(type=PaeType.Limit, id="lim", source="avg", min_limit=0.2, max_limit=limit))
+        motor.initiate()
+        return motor
+
+    # Record a reference run with random input
+    from random import Random
+    rnd = Random(1)
+    motor = build(0.8)
+    raw = motor.find_node("raw")
+    motor.add_driver(PaeRecorder(path, block_rows=1024))
+    for _ in range(10000):
+        raw.set_value(rnd.random())
+        motor.update()
+    motor.close()
+
+    # Replay against a motor with a changed limit
+    recording = PaeRecording(path)
+    print(PaeReplay(build(0.7), recording).run())
+
+
+if __name__ == "__main__":
+    main()
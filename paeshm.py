@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+#
+# Shared memory value table for Pae
+#
+# File:     paeshm.py
+# Author:   Peter Malmberg  <peter.malmberg@gmail.com>
+# Org:      __ORGANISTATION__
+# Date:     2026-10-19
+# License:  MIT
+# Python:   >= 3.8
+#
+# ----------------------------------------------------------------------------
+#
+# Segment layout (little endian):
+#
+#   0   magic      4s    b"PAE1"
+#   4   version    u32
+#   8   count      u32   number of nodes
+#   12  id_size    u32   bytes reserved per node id
+#   16  seq        u64   seqlock sequence, odd while the writer is active
+#   24  tick       u64   motor tick
+#   32  timestamp  f64   time.time() of the tick
+#   40  values     f64[count]
+#   ..  flags      u16[count]   PaeFlag bits
+#   ..  ids        id_size[count] utf-8, nul padded
+#
+# The writer bumps seq to an odd value, writes values/flags and bumps seq to
+# the next even value. Readers copy the data and retry if seq was odd or
+# changed during the copy.
+#
+# The table holds the nodes in ids, or all nodes with an id, and they are
+# observed while the table is open.
+#
+
+from __future__ import annotations
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+import struct
+import time
+import logging
+
+import numpy as np
+
+from pae import PaeDriver
+
+MAGIC = b"PAE1"
+VERSION = 1
+ID_SIZE = 32
+
+HEADER = struct.Struct("<4sIIIQQd")
+SEQ = struct.Struct("<Q")
+SEQ_OFFSET = 16
+TICK_OFFSET = 24
+VALUES_OFFSET = HEADER.size
+
+
+def segment_size(count: int, id_size: int = ID_SIZE) -> int:
+    return VALUES_OFFSET + count * 8 + count * 2 + count * id_size
+
+
+@dataclass
+class PaeSharedSnapshot:
+    seq: int = 0
+    tick: int = 0
+    timestamp: float = 0.0
+    ids: list = field(default_factory=list)
+    values: tuple = ()
+    flags: tuple = ()
+
+    def as_dict(self) -> dict:
+        return dict(zip(self.ids, self.values))
+
+
+class PaeSharedTable(PaeDriver):
+    def __init__(self, name: str = "pae", id_size: int = ID_SIZE, ids: list = None) -> None:
+        super().__init__()
+        self.name = name
+        self.id_size = id_size
+        self.ids = ids
+        self.shm = None
+        self.seq = 0
+        self.count = 0
+        self.index = None
+
+    def open(self) -> None:
+        # The table has one value per node, vector nodes are left out
+        nodes = self.select_nodes(self.ids, vectors=False)
+        self.index = np.array([node.index for node in nodes], dtype=np.intp)
+        self.count = len(nodes)
+        self.flags_offset = VALUES_OFFSET + 8 * self.count
+        self.ids_offset = self.flags_offset + 2 * self.count
+
+        self.shm = shared_memory.SharedMemory(
+            name=self.name, create=True, size=segment_size(self.count, self.id_size)
+        )
+        buf = self.shm.buf
+        HEADER.pack_into(buf, 0, MAGIC, VERSION, self.count, self.id_size, 0, 0, 0.0)
+        for i, node in enumerate(nodes):
+            id = node.id.encode()[: self.id_size]
+            off = self.ids_offset + i * self.id_size
+            buf[off: off + self.id_size] = id.ljust(self.id_size, b"\0")
+        logging.debug(f"Shared table {self.name} created with {self.count} nodes")
+
+    def output(self) -> None:
+        if self.shm is None:
+            self.open()
+
+        snap = self.motor.snapshot()
+        values = snap.values[self.index].astype("<f8").tobytes()
+        flags = snap.flags[self.index].astype("<u2").tobytes()
+        buf = self.shm.buf
+
+        self.seq += 1
+        SEQ.pack_into(buf, SEQ_OFFSET, self.seq)
+
+        buf[VALUES_OFFSET: self.flags_offset] = values
+        buf[self.flags_offset: self.ids_offset] = flags
+        struct.pack_into("<Qd", buf, TICK_OFFSET, snap.tick, snap.time)
+
+        self.seq += 1
+        SEQ.pack_into(buf, SEQ_OFFSET, self.seq)
+
+    def close(self) -> None:
+        if self.shm is None:
+            return
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+        self.release_nodes()
+
+
+class PaeSharedReader:
+    def __init__(self, name: str = "pae") -> None:
+        self.shm = shared_memory.SharedMemory(name=name)
+        try:
+            # Only the creating process should unlink the segment
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        except Exception:
+            pass
+
+        magic, version, count, id_size, _, _, _ = HEADER.unpack_from(self.shm.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Shared segment {name} is not a pae table")
+
+        self.count = count
+        self.data_fmt = struct.Struct(f"<Qd{count}d{count}H")
+        self.data_size = self.data_fmt.size
+        ids_offset = VALUES_OFFSET + count * 10
+        self.ids = [
+            bytes(self.shm.buf[ids_offset + i * id_size: ids_offset + (i + 1) * id_size])
+            .rstrip(b"\0")
+            .decode()
+            for i in range(count)
+        ]
+
+    def snapshot(self, retries: int = 1000) -> PaeSharedSnapshot:
+        buf = self.shm.buf
+        for _ in range(retries):
+            seq1 = SEQ.unpack_from(buf, SEQ_OFFSET)[0]
+            if seq1 & 1:
+                time.sleep(0)
+                continue
+            data = bytes(buf[TICK_OFFSET: TICK_OFFSET + self.data_size])
+            seq2 = SEQ.unpack_from(buf, SEQ_OFFSET)[0]
+            if seq1 == seq2:
+                fields = self.data_fmt.unpack(data)
+                return PaeSharedSnapshot(
+                    seq=seq1,
+                    tick=fields[0],
+                    timestamp=fields[1],
+                    ids=self.ids,
+                    values=fields[2: 2 + self.count],
+                    flags=fields[2 + self.count:],
+                )
+        raise TimeoutError("Could not get a consistent snapshot")
+
+    def close(self) -> None:
+        self.shm.close()
+
+
+def main() -> None:
+    import sys
+
+    name = sys.argv[1] if len(sys.argv) > 1 else "pae"
+    reader = PaeSharedReader(name)
+    while True:
+        snap = reader.snapshot()
+        print(f"tick {snap.tick}")
+        for id, value, flags in zip(snap.ids, snap.values, snap.flags):
+            print(f"  {id:10} {value:10.3f} {flags:04x}")
+        time.sleep(1)
+
+
+if __name__ == "__main__":
+    main()
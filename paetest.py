@@ -42,6 +42,7 @@ from PyQt5.QtWidgets import (
 
 from qterminalwidget import QTerminalWidget
 from pae import PaeNode, PaeMotor, PaeType
+from paeworker import PaeWorker
 from paeplot import PaePlot
 
 
@@ -213,7 +214,7 @@ class MainWindow(QMainWindow):
                 type=PaeType.Square,
                 name="Square",
                 id="sqr",
-                period=3.0
+                period=0.7
             )
         )
         self.motor.add_node(
@@ -293,8 +294,9 @@ class MainWindow(QMainWindow):
                 id="sint",
                 name="Sine offset",
                 #source="sin",
-                amplitude=6.0,
-                offset=8.0,
+                # The period of sqr_v, 0.5 to 2.9 s
+                amplitude=1.2,
+                offset=1.7,
             )
         )
         self.motor.add_node(
@@ -348,40 +350,46 @@ class MainWindow(QMainWindow):
             self.plotLayout.addWidget(pl)
             self.plots.append(pl)
 
+        self.worker = self.motor.add_driver(PaeWorker()).start()
+        self.shown_tick = -1
+
         self.timer = QTimer()
-        self.timer.setInterval(100)
+        self.timer.setInterval(50)
         self.timer.timeout.connect(self.timerx)
         self.timer.start()
 
     def timerx(self) -> None:
-        self.motor.update()
+        snap = self.worker.latest
+        if snap is None or snap.tick == self.shown_tick:
+            return
+        self.shown_tick = snap.tick
         for pl in self.plots:
-            pl.update()
+            pl.update(snap)
 
-        d = str(self.motor)
+        d = self.motor.text(snap)
         self.terminal.append_ansi_text(d)
         #print(d, end='')
 
     def trigger_timer(self) -> None:
-        self.cd_timer.trigger()
+        self.motor.post_trigger(self.cd_timer)
 
     def state_changed(self, state: int) -> None:
         logging.debug(f"Checkbox state changed: {state}")
         if state == Qt.Checked:
-            self.on_off.set_value(1)
+            self.motor.post_set_value(self.on_off, 1.0)
         else:
-            self.on_off.set_value(0)
+            self.motor.post_set_value(self.on_off, 0.0)
 
     def set_aslider(self, value: float) -> None:
-        self.aslider.set_value(value)
+        self.motor.post_set_value(self.aslider, float(value))
         
     def sin_enabled_changed(self, state: int) -> None:
         logging.debug(f"Sine enabled checkbox state changed: {state}")
         #sin_node = self.motor.get_node_by_id("sin")
         if state == Qt.Checked:
-            self.node_sine.enable(True)
+            self.motor.post_enable(self.node_sine, True)
         else:
-            self.node_sine.enable(False)
+            self.motor.post_enable(self.node_sine, False)
             
     def exit(self):
         msgBox = QMessageBox()
@@ -396,6 +404,8 @@ class MainWindow(QMainWindow):
         files = QFileDialog.getOpenFileNames(self, "Open file", ".", "*.*")
 
     def closeEvent(self, event: QCloseEvent) -> None:
+        self.worker.stop()
+        self.motor.close()
         self.exit()
         return super().closeEvent(event)
 
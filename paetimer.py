@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+#
+# Timer wheel for Pae
+#
+# File:     paetimer.py
+# Author:   Peter Malmberg  <peter.malmberg@gmail.com>
+# Org:      __ORGANISTATION__
+# Date:     2026-10-19
+# License:  MIT
+# Python:   >= 3.8
+#
+# ----------------------------------------------------------------------------
+#
+# Hierarchical timing wheel counting motor ticks. Level 0 has one slot per
+# tick, every higher level one slot per full turn of the level below. A timer
+# is put in the lowest level that reaches its due tick and moves down a level
+# each time the slot it is in comes round, so starting, stopping and expiring
+# a timer are O(1) and ticks without expiring timers cost next to nothing.
+#
+# Timers further away than the whole wheel wait in the top level and are put
+# back there until they are in reach.
+#
+# The motor moves the wheel to the slot of the time of each tick with
+# advance_to(), so ticks may come at any rate. Stretches without timers are
+# skipped in one step.
+#
+
+from __future__ import annotations
+
+
+class PaeTimer:
+    __slots__ = ("due", "callback", "slot")
+
+    def __init__(self, due: int, callback) -> None:
+        self.due = due
+        self.callback = callback
+        self.slot = None
+
+    def active(self) -> bool:
+        return self.slot is not None
+
+
+class PaeTimerWheel:
+    def __init__(self, slots: int = 64, levels: int = 4) -> None:
+        self.size = slots
+        self.levels = levels
+        self.wheel = [[{} for _ in range(slots)] for _ in range(levels)]
+        self.now = 0
+        self.count = 0
+
+    def start(self, ticks: int, callback) -> PaeTimer:
+        # callback(timer) is called from advance() in ticks ticks, at least one
+        timer = PaeTimer(self.now + max(int(ticks), 1), callback)
+        self.insert(timer)
+        self.count += 1
+        return timer
+
+    def stop(self, timer: PaeTimer) -> None:
+        if timer.slot is None:
+            return
+        del timer.slot[id(timer)]
+        timer.slot = None
+        self.count -= 1
+
+    def remaining(self, timer: PaeTimer) -> int:
+        if timer.slot is None:
+            return 0
+        return timer.due - self.now
+
+    def insert(self, timer: PaeTimer) -> None:
+        delta = timer.due - self.now
+        size = self.size
+        span = size
+        for level in range(self.levels):
+            if delta < span:
+                slot = self.wheel[level][(timer.due * size // span) % size]
+                break
+            span *= size
+        else:
+            # Out of reach, the slot before the current one is cascaded last
+            top = self.levels - 1
+            slot = self.wheel[top][(self.now // size ** top - 1) % size]
+        slot[id(timer)] = timer
+        timer.slot = slot
+
+    def advance(self) -> int:
+        # One tick, returns the number of expired timers
+        self.now += 1
+        now = self.now
+        size = self.size
+
+        for level in range(self.levels - 1, 0, -1):
+            span = size ** level
+            if now % span == 0:
+                slot = self.wheel[level][(now // span) % size]
+                if slot:
+                    timers = list(slot.values())
+                    slot.clear()
+                    for timer in timers:
+                        self.insert(timer)
+
+        slot = self.wheel[0][now % size]
+        if not slot:
+            return 0
+        expired = list(slot.values())
+        slot.clear()
+        for timer in expired:
+            timer.slot = None
+        self.count -= len(expired)
+        for timer in expired:
+            timer.callback(timer)
+        return len(expired)
+
+    def advance_to(self, now: int) -> int:
+        # All ticks up to now, returns the number of expired timers
+        expired = 0
+        while self.now < now:
+            if self.count == 0:
+                # Nothing can cascade or expire
+                self.now = now
+                break
+            expired += self.advance()
+        return expired
+
+
+def main() -> None:
+    import random
+    import time
+
+    wheel = PaeTimerWheel()
+    fired = []
+    due = {}
+    for _ in range(100000):
+        ticks = random.randint(1, 200000)
+        timer = wheel.start(ticks, lambda t: fired.append((t, wheel.now)))
+        due[id(timer)] = ticks
+
+    start = time.perf_counter()
+    while wheel.count:
+        wheel.advance()
+    elapsed = time.perf_counter() - start
+    late = sum(1 for t, now in fired if now != due[id(t)])
+    print(f"{len(fired)} timers over {wheel.now} ticks in {elapsed:.3f} s, {late} at the wrong tick")
+
+
+if __name__ == "__main__":
+    main()
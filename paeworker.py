@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------
+#
+# Motor worker thread for Pae
+#
+# File:     paeworker.py
+# Author:   Peter Malmberg  <peter.malmberg@gmail.com>
+# Org:      __ORGANISTATION__
+# Date:     2026-10-19
+# License:  MIT
+# Python:   >= 3.8
+#
+# ----------------------------------------------------------------------------
+#
+# Ticks a motor in its own thread, every motor.dt seconds, so a slow display
+# does not delay the control loop and a heavy graph does not freeze the GUI.
+#
+# Every tick the worker publishes the motor snapshot by replacing the
+# reference in latest. The snapshot being built is not visible until it is
+# complete and a reader keeps the one it took, so publishing and reading never
+# wait for each other. A GUI timer takes latest at display rate and skips
+# the redraw when the tick has not changed.
+#
+# Writes from the GUI go through the command queue of the motor
+# (motor.post_set_value() and friends).
+#
+# With max_interval the tick rate adapts: while no value moves more than
+# tolerance between ticks the interval is doubled, up to max_interval, and it
+# goes back to motor.dt on the first change or posted command. Nodes compute
+# from the time of the tick, so only the sampling changes, not the results.
+# Timers may expire up to one interval late.
+#
+
+from __future__ import annotations
+import threading
+import time
+import logging
+
+import numpy as np
+
+from pae import PaeDriver, PaeSnapshot
+
+
+class PaeWorker(PaeDriver):
+    def __init__(self, max_interval: float = None, tolerance: float = 0.0) -> None:
+        super().__init__()
+        self.latest = None
+        self.thread = None
+        self.stopping = threading.Event()
+        self.overruns = 0
+        self.max_interval = max_interval
+        self.tolerance = tolerance
+        self.interval = None
+
+    def output(self) -> None:
+        last = self.latest
+        snap = self.motor.snapshot()
+        self.latest = snap
+        if self.max_interval is not None:
+            self.adapt(last, snap)
+
+    def adapt(self, last: PaeSnapshot, snap: PaeSnapshot) -> None:
+        dt = self.motor.dt
+        if last is None or len(last.values) != len(snap.values):
+            self.interval = dt
+            return
+        with np.errstate(invalid="ignore"):
+            quiet = not np.any(np.abs(snap.values - last.values) > self.tolerance)
+        quiet = quiet and np.array_equal(snap.flags, last.flags)
+        quiet = quiet and all(np.array_equal(v, last.vectors.get(i)) for i, v in snap.vectors.items())
+        if quiet:
+            self.interval = min(2 * self.interval, self.max_interval)
+        else:
+            self.interval = dt
+
+    def snapshot(self) -> PaeSnapshot:
+        return self.latest
+
+    def start(self) -> PaeWorker:
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.run, name="pae-worker", daemon=True)
+        self.thread.start()
+        return self
+
+    def run(self) -> None:
+        motor = self.motor
+        self.interval = motor.dt
+        deadline = time.monotonic()
+        while not self.stopping.is_set():
+            try:
+                motor.update(time.monotonic())
+            except Exception:
+                logging.exception(f"Motor tick {motor.tick} failed")
+
+            deadline += self.interval
+            delay = deadline - time.monotonic()
+            if delay < 0:
+                # Late, skip the missed ticks rather than running them back
+                # to back
+                self.overruns += 1
+                deadline = time.monotonic()
+                delay = 0
+            while delay > 0:
+                # Long intervals are waited out in steps of dt, to tick as
+                # soon as a command is posted
+                if self.stopping.wait(min(delay, motor.dt)):
+                    return
+                if motor.commands:
+                    self.interval = motor.dt
+                    deadline = time.monotonic()
+                    break
+                delay = deadline - time.monotonic()
+
+    def stop(self) -> None:
+        # Call before motor.close(), the other drivers must not be closed
+        # while the worker is ticking
+        if self.thread is None:
+            return
+        self.stopping.set()
+        if threading.current_thread() is not self.thread:
+            self.thread.join()
+        self.thread = None
+
+    def close(self) -> None:
+        self.stop()
+
+
+def main() -> None:
+    from pae import PaeMotor, PaeNode, PaeType
+
+    motor = PaeMotor(dt=0.01)
+    motor.add_node(PaeNode(type=PaeType.Sine, id="sin", period=1.0))
+    motor.add_node(PaeNode(type=PaeType.Max, id="max", source="sin"))
+    motor.initiate()
+    worker = motor.add_driver(PaeWorker()).start()
+
+    shown = -1
+    for _ in range(10):
+        # A display refreshing at 5 Hz
+        time.sleep(0.2)
+        snap = worker.latest
+        if snap is not None and snap.tick != shown:
+            shown = snap.tick
+            print(f"tick {snap.tick:4} {snap.as_dict()}")
+    worker.stop()
+    motor.close()
+    print(f"{worker.overruns} overruns")
+
+    # Adaptive, a quiet motor ticks every 0.5 s until the setpoint is written
+    motor = PaeMotor(dt=0.01)
+    setpoint = motor.add_node(PaeNode(type=PaeType.Normal, id="setpoint"))
+    motor.initiate()
+    worker = motor.add_driver(PaeWorker(max_interval=0.5)).start()
+    time.sleep(2.0)
+    ticks = motor.tick
+    motor.post_set_value(setpoint, 1.0)
+    time.sleep(0.05)
+    worker.stop()
+    print(f"{ticks} ticks in 2 s while quiet, setpoint {setpoint.value} after 50 ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -31,7 +31,8 @@ from PyQt5.QtWidgets import (
     QLineEdit,
 )
 import pyqtgraph as pg
-from pae import PaeNode, PaeType, PaeMotor
+from pae import PaeNode, PaeType, PaeMotor, PaeSnapshot, flags_text
+from paeworker import PaeWorker
 
 pen = pg.mkPen(color="#ff00ff", width=0.6)
 pen_default = pg.mkPen(color="#00ff00", width=0.6)
@@ -44,6 +45,14 @@ pg_color_yellow = "#ffff00"
 pg_color_cyan = "#00ffff"
 pg_color_magenta = "#ff00ff"
 
+def node_state(node: PaeNode, snap: PaeSnapshot = None) -> tuple:
+    # (value, flags) from the snapshot published by a PaeWorker when given,
+    # the motor may be in the middle of a tick
+    if snap is None:
+        return node.value, node.get_flags()
+    return snap.get(node)
+
+
 class QPaePlot(pg.PlotWidget):
     def __init__(self, node: PaeNode, datapoints=1000, intervall: int = 1, parent=None):
         super().__init__(background="default",
@@ -59,15 +68,21 @@ class QPaePlot(pg.PlotWidget):
 
         self.line = self.plot(self.x, self.y, pen=pen)
 
-    def update(self):
+        if node.motor is not None:
+            node.motor.observe(node)
+
+    def update(self, snap: PaeSnapshot = None):
         self.tick += 1
         if self.tick >= self.intervall:
-            self.update_plot(self.node.value)
+            if snap is None:
+                self.update_plot(self.node.value)
+            else:
+                self.update_plot(snap.get(self.node)[0], snap.time)
             self.tick = 0
 
-    def update_plot(self, new_val):
+    def update_plot(self, new_val, t: float = None):
         self.x.pop(0)
-        self.x.append(time.time())
+        self.x.append(time.time() if t is None else t)
         self.y.pop(0)
         self.y.append(new_val)
         self.line.setData(self.x, self.y)
@@ -91,15 +106,17 @@ class QPaePlots(pg.PlotWidget):
         line = self.plot(self.x, y, pen=pen)
 
         self.nodes.append((node, y, line))
+        if node.motor is not None:
+            node.motor.observe(node)
 
-    def update(self):
+    def update(self, snap: PaeSnapshot = None):
         self.tick += 1
         self.x.pop(0)
-        self.x.append(time.time())
+        self.x.append(time.time() if snap is None else snap.time)
         if self.tick >= self.intervall:
             for (node, y, line) in self.nodes:
                 y.pop(0)
-                y.append(node.value)
+                y.append(node_state(node, snap)[0])
                 line.setData(self.x, y)
 
             self.tick = 0
@@ -133,7 +150,7 @@ class QPaeNode(QWidget):
         self.name_label = self.add_label(f"{self.node.get_name()}", 150)
         self.id_label = self.add_label(f"{self.node.id}", 120)
         self.type_label = self.add_label(f"{self.node.type.name}", 140)
-        self.flags_label = self.add_label("", 60)
+        self.flags_label = self.add_label("", 80)
         self.value_label = self.add_label("", 100)
         self.data_layout.addStretch()
         #self.data_layout.setStretchFactor(self.data_layout.itemAt(5), 1)
@@ -148,7 +165,7 @@ class QPaeNode(QWidget):
 
         if self.node.type == PaeType.CountDownTimer:
             self.reset_button = QPushButton("Reset")
-            self.reset_button.clicked.connect(lambda: self.node.trigger())
+            self.reset_button.clicked.connect(lambda: self.node.motor.post_trigger(self.node))
             self.control_layout.addWidget(self.reset_button)
 
         self.control_layout.addStretch()
@@ -160,28 +177,16 @@ class QPaeNode(QWidget):
     def node_enable_changed(self, state: int) -> None:
         logging.debug(f"Node {self.node.get_name()} enabled state changed: {state}")
         if state == Qt.Checked:
-            self.node.enable(True)
-        else:
-            self.node.enable(False)
-
-    def update(self) -> None:
-
-        self.value_label.setText(f"{self.node.value:.3f}")
-        if self.node.is_enabled() is True:
-            enabled = "E"
+            self.node.motor.post_enable(self.node, True)
         else:
-            enabled = "D"
+            self.node.motor.post_enable(self.node, False)
 
-        if self.node.source_enabled() is False:
-            n_src = "SD"
-        else:
-            n_src = "  "
+    def update(self, snap: PaeSnapshot = None) -> None:
+        value, flags = node_state(self.node, snap)
+        self.value_label.setText(f"{value:.3f}")
+        self.flags_label.setText(flags_text(flags))
 
-        self.flags_label.setText(
-            f"{enabled:1} {n_src:2}"
-        )
-
-        self.plot.update()
+        self.plot.update(snap)
 
 
 class QPaeMonitorNode(QWidget):
@@ -214,7 +219,7 @@ class QPaeMonitorNode(QWidget):
             self.id_label = self.add_qlabel("ID", 120)
             self.type_label = self.add_qlabel("Type", 140)
             self.source_id = self.add_qlabel("Source ID", 120)
-            self.flags_label = self.add_qlabel("Flags", 60)
+            self.flags_label = self.add_qlabel("Flags", 80)
             self.value_label = self.add_qlabel("Value", 100)
             return
 
@@ -226,27 +231,15 @@ class QPaeMonitorNode(QWidget):
         else:
             self.source_id = self.add_label("", 120)
         
-        self.flags_label = self.add_label("", 60)
+        self.flags_label = self.add_label("", 80)
         self.value_label = self.add_label("", 100)
 
         self.update()
 
-    def update(self) -> None:
-
-        self.value_label.setText(f"{self.node.value:.3f}")
-        if self.node.is_enabled() is True:
-            enabled = "E"
-        else:
-            enabled = "D"
-
-        if self.node.source_enabled() is False:
-            n_src = "SD"
-        else:
-            n_src = "  "
-
-        self.flags_label.setText(
-            f"{enabled:1} {n_src:2}"
-        )
+    def update(self, snap: PaeSnapshot = None) -> None:
+        value, flags = node_state(self.node, snap)
+        self.value_label.setText(f"{value:.3f}")
+        self.flags_label.setText(flags_text(flags))
 
 
 class QPaeMonitor(QDialog):
@@ -271,9 +264,9 @@ class QPaeMonitor(QDialog):
             self.main_layout.addWidget(nw)
             self.node_widgets.append(nw)
 
-    def update(self) -> None:
+    def update(self, snap: PaeSnapshot = None) -> None:
         for nw in self.node_widgets:
-            nw.update()
+            nw.update(snap)
 
     @staticmethod
     def monitor(motor: PaeMotor) -> None:
@@ -309,7 +302,7 @@ class MainWindow(QMainWindow):
                 type=PaeType.Square,
                 name="Square",
                 id="sqr",
-                period=12.0
+                period=2.5
             )
         )
         sin_sqr_node = self.motor.add_node(
@@ -337,6 +330,11 @@ class MainWindow(QMainWindow):
 
         self.monitor = None
 
+        # The motor ticks in the worker thread, the display refreshes at its
+        # own rate from the latest snapshot
+        self.worker = self.motor.add_driver(PaeWorker()).start()
+        self.shown_tick = -1
+
         self.timer = QTimer()
         self.timer.setInterval(100)
         self.timer.timeout.connect(self.timerx)
@@ -347,20 +345,26 @@ class MainWindow(QMainWindow):
             # self.monitor = QPaeMonitor(self.motor, self)
             # self.monitor.show()
             self.monitor = QPaeMonitor.monitor(self.motor)
-        
-        self.motor.update()
+
+        snap = self.worker.latest
+        if snap is None or snap.tick == self.shown_tick:
+            return
+        self.shown_tick = snap.tick
+
         for nw in self.node_widgets:
-            nw.update()
+            nw.update(snap)
 
-        self.multi_plot.update()
+        self.multi_plot.update(snap)
 
         if self.monitor is not None:
-            self.monitor.update()
+            self.monitor.update(snap)
 
     def exit(self):
         return super().close()  # Placeholder for any cleanup actions
 
     def closeEvent(self, event: QCloseEvent) -> None:
+        self.worker.stop()
+        self.motor.close()
         self.monitor.close()
         self.exit()
         return super().closeEvent(event)